@@ -1,34 +1,66 @@
-from flask import Flask, request, session
-from flask_admin import Admin
-from flask_babel import Babel
+from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_wtf import CSRFProtect
-from sqlalchemy import text
+from app.database import configure_pools, init_engine
+from app.routing import RoutingSession, router
 
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+csrf = CSRFProtect()
 
-def get_locale():
-    if request.args.get('lang'):
-        session['lang'] = request.args.get('lang')
-    return session.get('lang', 'en')
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
 
-app = Flask(__name__)
-csrf = CSRFProtect(app)
-babel = Babel(app, locale_selector=get_locale)
-admin = Admin(app, template_mode='bootstrap4')
-app.config.from_object('config')
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
 
-login_manager = LoginManager()
-login_manager.init_app(app)
+# Build an app from a config object or import path, with settings applied on
+# top. The admin panel, migrations and i18n are only imported and registered
+# when ADMIN_ENABLED, MIGRATIONS_ENABLED and I18N_ENABLED are set, so workers
+# that only serve the public pages skip Flask-Admin, Alembic and Babel.
+def create_app(config='config', **settings):
+    app = Flask(__name__)
+    app.config.from_object(config)
+    app.config.update(settings)
+
+    csrf.init_app(app)
+    configure_pools(app)
+    db.init_app(app)
+    init_engine(app, db)
+    router.init_app(app)
+    login_manager.init_app(app)
+
+    from app import models, views, commands
+    from app.likes import like_buffer
+    from app.pubsub import hub
+    from app.friend_graph import friend_graph
+    from app.timeline import home_timeline
+    from app.fragments import fragment_cache
+    from app.passwords import hasher
+    from app.metrics import metrics
+    from app.retention import retention
+    from app.deletion import deleter
+    from app.jobs import jobs
 
-login_manager.login_view = 'login'
+    app.register_blueprint(views.bp)
+    app.register_blueprint(commands.bp)
+    like_buffer.init_app(app)
+    hub.init_app(app)
+    friend_graph.init_app(app)
+    home_timeline.init_app(app)
+    fragment_cache.init_app(app)
+    hasher.init_app(app)
+    metrics.init_app(app)
+    retention.init_app(app)
+    deleter.init_app(app)
+    jobs.init_app(app)
 
-@app.before_request
-def enable_foreign_keys():
-    if db.engine.url.get_backend_name() == 'sqlite':
-        db.session.execute(text("PRAGMA foreign_keys=ON"))
+    if app.config.get('I18N_ENABLED', True):
+        from app import i18n
+        i18n.init_app(app)
+    if app.config.get('ADMIN_ENABLED', True):
+        from app import admin
+        admin.init_app(app)
+    if app.config.get('MIGRATIONS_ENABLED', True):
+        from flask_migrate import Migrate
+        Migrate(app, db)
 
-from app import views, models
\ No newline at end of file
+    return app
@@ -0,0 +1,140 @@
+import threading
+import time
+from flask import current_app, request, url_for
+from flask_admin import Admin
+from flask_admin.contrib.sqla import ModelView
+from flask_admin.contrib.sqla.filters import BaseSQLAFilter, FilterEqual
+from sqlalchemy.orm import configure_mappers
+from app import db
+from .models import User, FriendRequest, Post, PostLikes, Notification
+
+configure_mappers() # Backrefs such as PostLikes.post exist once mappers are configured
+
+
+# Filters a string column by prefix as a range, so its index is used
+# (LIKE 'x%' can't use it, SQLite's LIKE ignores case)
+class FilterPrefix(BaseSQLAFilter):
+    def apply(self, query, value, alias=None):
+        column = self.get_column(alias)
+        if not value:
+            return query
+        return query.filter(column >= value, column < value[:-1] + chr(ord(value[-1]) + 1))
+
+    def operation(self):
+        return 'starts with'
+
+
+# Admin list views that stay fast on tables with millions of rows. Pages are
+# fetched by the sort column with ?after=<last value> instead of OFFSET, the
+# exact COUNT(*) behind the numbered pager is replaced by a count cached for
+# ADMIN_COUNT_CACHE_TTL seconds, only indexed unique columns can be sorted on
+# and only indexed columns filtered on, and related users and posts are
+# loaded in the same query.
+class ScalableModelView(ModelView):
+    list_template = 'admin/keyset_list.html'
+    simple_list_pager = True
+    can_set_page_size = False
+    page_size = 50
+    column_default_sort = ('id', True)
+    column_sortable_list = ('id',)
+    column_display_pk = True
+
+    _counts = {} # table name -> (counted_at, row count)
+    _counts_lock = threading.Lock()
+
+    def _sort_desc(self):
+        if 'sort' not in request.args:
+            return self.column_default_sort[1]
+        return request.args.get('desc') == '1'
+
+    # The column the list is ordered by: ?sort=<index into column_list> or the default
+    def _sort_column(self):
+        column = self._get_column_by_idx(request.args.get('sort', type=int))
+        name = column[0] if column and column[0] in self.column_sortable_list else self.column_default_sort[0]
+        return getattr(self.model, name)
+
+    def get_query(self):
+        query = super().get_query()
+        after = request.args.get('after')
+        if after is not None:
+            column = self._sort_column()
+            try:
+                after = column.type.python_type(after)
+            except ValueError:
+                return query
+            query = query.filter(column < after if self._sort_desc() else column > after)
+        return query
+
+    # With ?after the position comes from the id, not the page number
+    def get_list(self, page, *args, **kwargs):
+        if 'after' in request.args:
+            page = 0
+        return super().get_list(page, *args, **kwargs)
+
+    def next_page_url(self, data):
+        if len(data) < self.page_size:
+            return None
+        args = request.args.to_dict()
+        args.pop('page', None)
+        args['after'] = getattr(data[-1], self._sort_column().key)
+        return url_for('.index_view', **args)
+
+    def first_page_url(self):
+        args = request.args.to_dict()
+        args.pop('page', None)
+        args.pop('after', None)
+        return url_for('.index_view', **args)
+
+    # Whole-table row count, recounted at most every ADMIN_COUNT_CACHE_TTL seconds
+    def approximate_count(self):
+        table = self.model.__tablename__
+        now = time.monotonic()
+        with self._counts_lock:
+            cached = self._counts.get(table)
+        if cached and now - cached[0] < current_app.config.get('ADMIN_COUNT_CACHE_TTL', 300):
+            return cached[1]
+        count = db.session.query(db.func.count(self.model.id)).scalar()
+        with self._counts_lock:
+            self._counts[table] = (now, count)
+        return count
+
+
+class UserView(ScalableModelView):
+    column_list = ('id', 'username', 'full_name', 'friend_count', 'post_count', 'unread_count')
+    column_sortable_list = ('id', 'username')
+    column_filters = (FilterEqual(User.username, 'Username'), FilterPrefix(User.username, 'Username'))
+    column_exclude_list = ('password',)
+
+
+class FriendRequestView(ScalableModelView):
+    column_list = ('id', 'sender.username', 'receiver.username', 'status', 'timestamp')
+    column_select_related_list = (FriendRequest.sender, FriendRequest.receiver)
+
+
+class PostView(ScalableModelView):
+    column_list = ('id', 'poster.username', 'title', 'like_count', 'timestamp')
+    column_select_related_list = (Post.poster,)
+    column_filters = ('user_id',)
+
+
+class PostLikesView(ScalableModelView):
+    column_list = ('id', 'post.title', 'user.username', 'is_liked')
+    column_select_related_list = (PostLikes.post, PostLikes.user)
+    column_filters = ('post_id',)
+
+
+class NotificationView(ScalableModelView):
+    column_list = ('id', 'user.username', 'kind', 'message', 'is_read', 'actor_count', 'timestamp')
+    column_select_related_list = (Notification.user,)
+    column_filters = ('user_id',)
+
+
+# Admin view for database
+def init_app(app):
+    admin = Admin(app, template_mode='bootstrap4')
+    admin.add_view(UserView(User, db.session))
+    admin.add_view(FriendRequestView(FriendRequest, db.session))
+    admin.add_view(PostView(Post, db.session))
+    admin.add_view(PostLikesView(PostLikes, db.session))
+    admin.add_view(NotificationView(Notification, db.session))
+    return admin
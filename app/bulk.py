@@ -0,0 +1,150 @@
+import csv
+import json
+import os
+from itertools import islice
+from sqlalchemy.exc import OperationalError
+from app import db
+from . import search
+
+
+# Streaming bulk export and import of the main tables as JSONL or CSV. Rows
+# move in chunks of a fixed size in both directions, so memory stays flat
+# whatever the table size. Values are copied as stored (timestamps as text,
+# booleans as 0/1); in CSV an empty field is read back as NULL.
+TABLES = ('user_table', 'friends', 'post_table', 'post_likes', 'notification_table')
+
+
+def columns(table_name):
+    return [column.name for column in db.metadata.tables[table_name].columns]
+
+
+def quoted(names):
+    return ', '.join('"%s"' % name for name in names)
+
+
+# Rows in rowid order, fetched chunk_size at a time by keyset on rowid
+def iter_rows(connection, table_name, chunk_size=5000):
+    names = columns(table_name)
+    select = (f"SELECT rowid, {quoted(names)} FROM {table_name} "
+              f"WHERE rowid > ? ORDER BY rowid LIMIT {int(chunk_size)}")
+    last = 0
+    while True:
+        rows = connection.exec_driver_sql(select, (last,)).fetchall()
+        if not rows:
+            return
+        for row in rows:
+            yield dict(zip(names, row[1:]))
+        last = rows[-1][0]
+
+
+def export_table(table_name, out, fmt='jsonl', chunk_size=5000):
+    names = columns(table_name)
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(out, fieldnames=names, lineterminator='\n')
+        writer.writeheader()
+    count = 0
+    with db.engine.connect() as connection:
+        for row in iter_rows(connection, table_name, chunk_size):
+            if writer:
+                writer.writerow(row)
+            else:
+                out.write(json.dumps(row) + '\n')
+            count += 1
+    return count
+
+
+def read_rows(file, fmt='jsonl'):
+    if fmt == 'csv':
+        for row in csv.DictReader(file):
+            yield {name: (value if value != '' else None) for name, value in row.items()}
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+# Drop a table's non-unique indexes (and the search triggers for users), so
+# they are built once after the import instead of updated row by row
+def drop_indexes(connection, table_name):
+    table = db.metadata.tables[table_name]
+    for index in table.indexes:
+        if not index.unique:
+            connection.exec_driver_sql(f"DROP INDEX IF EXISTS {index.name}")
+    if table_name == 'user_table':
+        for statement in search.DROP_DDL:
+            connection.exec_driver_sql(statement)
+
+
+def create_indexes(connection, table_name):
+    table = db.metadata.tables[table_name]
+    for index in table.indexes:
+        if not index.unique:
+            index.create(connection, checkfirst=True)
+    if table_name == 'user_table':
+        try:
+            search.create_index(connection)
+            search.rebuild_index(connection)
+        except OperationalError:
+            pass # SQLite built without FTS5
+
+
+def load_progress(path):
+    if path and os.path.exists(path):
+        with open(path) as f:
+            return json.load(f).get('rows', 0)
+    return 0
+
+
+def save_progress(path, rows):
+    if path:
+        with open(path, 'w') as f:
+            json.dump({'rows': rows}, f)
+
+
+# Insert rows chunk by chunk, committing each chunk with one executemany.
+# Rows already present are skipped, so an import can be re-run or resumed:
+# with a progress file the rows committed by an interrupted run are skipped
+# without reading them into the database again, and the file is removed once
+# the whole input is loaded. Returns (rows read, rows skipped by resume).
+def import_table(table_name, file, fmt='jsonl', chunk_size=5000, defer_indexes=False, progress_path=None):
+    names = columns(table_name)
+    insert = (f"INSERT OR IGNORE INTO {table_name} ({quoted(names)}) "
+              f"VALUES ({', '.join('?' for _ in names)})")
+    done = skipped = load_progress(progress_path)
+    rows = islice(read_rows(file, fmt), skipped, None)
+
+    if defer_indexes:
+        with db.engine.begin() as connection:
+            drop_indexes(connection, table_name)
+    try:
+        while True:
+            chunk = [tuple(row.get(name) for name in names) for row in islice(rows, chunk_size)]
+            if not chunk:
+                break
+            with db.engine.begin() as connection:
+                connection.exec_driver_sql(insert, chunk)
+            done += len(chunk)
+            save_progress(progress_path, done)
+        if progress_path and os.path.exists(progress_path):
+            os.remove(progress_path)
+    finally:
+        if defer_indexes:
+            with db.engine.begin() as connection:
+                create_indexes(connection, table_name)
+    return done, skipped
+
+
+# Rebuild the counters that depend on an imported table in bulk
+def recount(table_names):
+    from .models import User, Post, Notification
+    table_names = set(table_names)
+    if table_names & {'user_table', 'friends'}:
+        User.recompute_friend_counts()
+    if table_names & {'user_table', 'post_table'}:
+        User.recompute_post_counts()
+    if table_names & {'post_table', 'post_likes'}:
+        Post.recompute_like_counts()
+    if table_names & {'user_table', 'notification_table'}:
+        Notification.recompute_unread_counts()
+    db.session.commit()
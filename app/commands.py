@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+import click
+from flask import Blueprint
+from app import db
+from . import bulk
+from .models import User, Post, Notification
+from .timeline import home_timeline
+from .retention import retention
+from .deletion import deleter
+from .jobs import jobs
+
+
+# Commands are registered at the top level: flask repair-like-counts, ...
+bp = Blueprint('commands', __name__, cli_group=None)
+
+
+# Recompute every post's like_count from post_likes
+@bp.cli.command('repair-like-counts')
+def repair_like_counts():
+    updated = Post.recompute_like_counts()
+    db.session.commit()
+    click.echo(f"Recomputed like counts for {updated} posts.")
+
+
+# Recompute every user's unread notification count from notification_table
+@bp.cli.command('repair-unread-counts')
+def repair_unread_counts():
+    updated = Notification.recompute_unread_counts()
+    db.session.commit()
+    click.echo(f"Recomputed unread counts for {updated} users.")
+
+
+# Rebuild every user's materialized home timeline from posts and friendships
+@bp.cli.command('backfill-home-timeline')
+def backfill_home_timeline():
+    rows = home_timeline.backfill(db.session)
+    db.session.commit()
+    click.echo(f"Wrote {rows} home timeline rows.")
+
+
+# Delete notifications past their retention period, in small batches
+@bp.cli.command('purge-notifications')
+@click.option('--batch-size', type=int, help="Rows per transaction (default NOTIFICATION_PURGE_BATCH)")
+@click.option('--archive/--no-archive', default=None, help="Summarize deleted rows in notification_archive (default NOTIFICATION_ARCHIVE)")
+def purge_notifications(batch_size, archive):
+    deleted = retention.purge(batch_size, archive)
+    click.echo(f"Purged {deleted} expired notifications.")
+
+
+# Delete an account and everything that belongs to it, in the foreground
+@bp.cli.command('delete-user')
+@click.argument('user_id', type=int)
+def delete_user(user_id):
+    if db.session.get(User, user_id) is None:
+        raise click.ClickException(f"User {user_id} not found.")
+    deleter.purge_user(user_id)
+    click.echo(f"Deleted user {user_id}.")
+
+
+# Job worker process: flask run-jobs --workers 4 (or --once to run what is
+# due and exit, e.g. from cron)
+@bp.cli.command('run-jobs')
+@click.option('--workers', default=1, show_default=True, help="Worker threads")
+@click.option('--once', is_flag=True, help="Run the jobs that are due and exit")
+def run_jobs(workers, once):
+    if once:
+        ran = jobs.run_pending()
+        jobs.fail_abandoned()
+        click.echo(f"Ran {ran} jobs.")
+        return
+
+    stop = threading.Event()
+    threads = [threading.Thread(target=jobs.work, args=(f'cli-{os.getpid()}-{i}', stop), daemon=True)
+               for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    click.echo(f"Running jobs with {workers} workers, Ctrl+C to stop.")
+    try:
+        while any(thread.is_alive() for thread in threads):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        stop.set() # Workers stop after their current job and poll
+        for thread in threads:
+            thread.join()
+
+
+def data_format(fmt, path):
+    if fmt:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+# Stream a table to a file (or stdout) as JSONL or CSV:
+#   flask export-data post_table -o posts.jsonl
+@bp.cli.command('export-data')
+@click.argument('table', type=click.Choice(bulk.TABLES))
+@click.option('-o', '--output', default='-', help="File to write, - for stdout")
+@click.option('--format', 'fmt', type=click.Choice(('jsonl', 'csv')), help="Defaults to the output file's extension, else jsonl")
+@click.option('--chunk-size', default=5000, show_default=True)
+def export_data(table, output, fmt, chunk_size):
+    with click.open_file(output, 'w') as out:
+        rows = bulk.export_table(table, out, data_format(fmt, output), chunk_size)
+    click.echo(f"Exported {rows} rows from {table}.", err=True)
+
+
+# Load a JSONL or CSV file into a table in committed chunks, then rebuild the
+# counters that depend on it:
+#   flask import-data post_table posts.jsonl --defer-indexes --resume
+# With --resume the number of committed rows is kept in PATH.progress until
+# the load finishes, and a re-run after a failure continues from there.
+@bp.cli.command('import-data')
+@click.argument('table', type=click.Choice(bulk.TABLES))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(('jsonl', 'csv')), help="Defaults to the file's extension, else jsonl")
+@click.option('--chunk-size', default=5000, show_default=True)
+@click.option('--defer-indexes', is_flag=True, help="Drop secondary indexes during the load and build them once after it")
+@click.option('--resume', is_flag=True, help="Record progress in PATH.progress and continue from it")
+@click.option('--recount/--no-recount', default=True, help="Recompute friend, post, like and unread counts afterwards")
+def import_data(table, path, fmt, chunk_size, defer_indexes, resume, recount):
+    progress_path = path + '.progress' if resume else None
+    with open(path, newline='') as file:
+        rows, skipped = bulk.import_table(table, file, data_format(fmt, path), chunk_size,
+                                          defer_indexes, progress_path)
+    click.echo(f"Loaded {rows - skipped} rows into {table}" + (f" after skipping {skipped}." if skipped else "."))
+    if recount:
+        bulk.recount([table])
+        click.echo("Recomputed counters.")
+    if home_timeline.enabled and table in ('friends', 'post_table'):
+        click.echo("Run flask backfill-home-timeline to include the imported rows in home timelines.")
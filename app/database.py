@@ -0,0 +1,76 @@
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+
+# Connection-level SQLite setup. SQLITE_PRAGMAS are applied once to every new
+# pooled DBAPI connection instead of on each request: WAL lets readers run
+# alongside a writer, synchronous=NORMAL is safe under WAL, busy_timeout makes
+# writers wait for the lock instead of failing, and cache_size/mmap_size keep
+# hot pages in memory. Pool sizing comes from SQLALCHEMY_ENGINE_OPTIONS (and
+# from each bind's own options in SQLALCHEMY_BINDS), but only for engines on a
+# QueuePool: in-memory SQLite gets a StaticPool, which rejects the sizing
+# arguments, so they are dropped for it (and for any other poolclass set
+# explicitly). Read replica connections are also made query_only, so a write
+# routed to one fails instead of diverging from the primary.
+DEFAULT_PRAGMAS = {
+    'foreign_keys': 'ON',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+}
+
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout', 'pool_use_lifo')
+
+
+def uses_queue_pool(url, options):
+    if 'poolclass' in options:
+        return issubclass(options['poolclass'], QueuePool)
+    url = make_url(url)
+    return not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'))
+
+
+def pool_options(url, options):
+    if uses_queue_pool(url, options):
+        return options
+    return {name: value for name, value in options.items() if name not in QUEUE_POOL_OPTIONS}
+
+
+# Call before db.init_app: drops queue pool sizing from the primary's and the
+# binds' options where the engine won't use a QueuePool
+def configure_pools(app):
+    config = app.config
+    if config.get('SQLALCHEMY_DATABASE_URI'):
+        config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(config['SQLALCHEMY_DATABASE_URI'],
+                                                           config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    binds = {}
+    for key, bind in config.get('SQLALCHEMY_BINDS', {}).items():
+        if isinstance(bind, dict):
+            bind = pool_options(bind['url'], bind)
+        binds[key] = bind
+    config['SQLALCHEMY_BINDS'] = binds
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def init_engine(app, db):
+    pragmas = app.config.get('SQLITE_PRAGMAS', DEFAULT_PRAGMAS)
+    replicas = app.config.get('READ_REPLICAS', [])
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            listen_pragmas(engine, dict(pragmas, query_only='ON') if key in replicas else pragmas)
+
+
+def listen_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        apply_pragmas(dbapi_connection, pragmas)
@@ -0,0 +1,135 @@
+import time
+from sqlalchemy import bindparam, text
+from app import db
+from .models import User, Post, Notification, DISABLED_PASSWORD
+from .friend_graph import friend_graph
+from .fragments import fragment_cache
+from .timeline import home_timeline
+from .pubsub import hub, user_channel
+from .jobs import jobs
+
+
+# Deletion of posts and accounts. The request only hides its target (a post
+# is detached from its author's profile and from home timelines, an account
+# can no longer log in) and queues a job (see app/jobs.py). The job deletes
+# the dependent rows (likes, notifications, friend edges, requests,
+# timelines, an account's posts) DELETION_BATCH rows per transaction, with a
+# pause between batches, so a heavy post or user never holds SQLite's write
+# lock for long. Counters of the other users and posts involved are
+# recomputed as each batch is removed, and a retried job carries on where
+# the last attempt stopped. Each batch extends the job's lease. ON DELETE
+# CASCADE foreign keys clean up after deletions made elsewhere.
+class Deleter:
+    def __init__(self, app=None):
+        self.batch_size = 500
+        self.pause = 0.05
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.batch_size = app.config.get('DELETION_BATCH', 500)
+        self.pause = app.config.get('DELETION_PAUSE', 0.05)
+
+    def delete_post(self, post_id):
+        author_id = db.session.execute(text("SELECT user_id FROM post_table WHERE id = :post_id"),
+                                       {'post_id': post_id}).scalar()
+        db.session.execute(text("UPDATE post_table SET user_id = NULL WHERE id = :post_id"), {'post_id': post_id})
+        home_timeline.remove_post(db.session, post_id)
+        if author_id is not None:
+            User.recompute_post_counts([author_id])
+        fragment_cache.invalidate_after_commit(db.session, post_id)
+        jobs.enqueue('delete_post', {'post_id': post_id}, key=f'delete_post:{post_id}')
+        db.session.commit()
+
+    def delete_user(self, user_id):
+        db.session.execute(text("UPDATE user_table SET password = :password WHERE id = :user_id"),
+                           {'password': DISABLED_PASSWORD, 'user_id': user_id})
+        jobs.enqueue('delete_user', {'user_id': user_id}, key=f'delete_user:{user_id}')
+        db.session.commit()
+
+    # Delete the rows of a table matching a condition, one batch per commit.
+    # after_batch gets the deleted rows (rowid first, then columns).
+    def _delete_batches(self, table, where, params, columns=(), after_batch=None):
+        select = text(f"SELECT {', '.join(('rowid',) + columns)} FROM {table} WHERE {where} LIMIT :batch_size")
+        delete = text(f"DELETE FROM {table} WHERE rowid IN :rowids").bindparams(bindparam('rowids', expanding=True))
+        while True:
+            rows = db.session.execute(select, dict(params, batch_size=self.batch_size)).all()
+            if not rows:
+                return
+            try:
+                db.session.execute(delete, {'rowids': [row[0] for row in rows]})
+                if after_batch:
+                    after_batch(rows)
+                jobs.heartbeat()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            if len(rows) == self.batch_size:
+                time.sleep(self.pause) # Let waiting writers take the lock
+
+    def purge_post(self, post_id):
+        params = {'post_id': post_id}
+        self._delete_batches('home_timeline', "post_id = :post_id", params)
+        self._delete_batches('post_likes', "post_id = :post_id", params)
+        self._delete_batches('notification_table', "post_id = :post_id", params,
+                             ('user_id', 'is_read'), self._recount_unread)
+
+        author_id = db.session.execute(text("SELECT user_id FROM post_table WHERE id = :post_id"), params).scalar()
+        db.session.execute(text("DELETE FROM post_table WHERE id = :post_id"), params)
+        if author_id is not None:
+            User.recompute_post_counts([author_id])
+        fragment_cache.invalidate_after_commit(db.session, post_id)
+        jobs.heartbeat()
+        db.session.commit()
+
+    def purge_user(self, user_id):
+        params = {'user_id': user_id}
+        while True:
+            post_ids = db.session.execute(text("SELECT id FROM post_table WHERE user_id = :user_id LIMIT :batch_size"),
+                                          dict(params, batch_size=self.batch_size)).scalars().all()
+            if not post_ids:
+                break
+            for post_id in post_ids:
+                self.purge_post(post_id)
+
+        self._delete_batches('post_likes', "user_id = :user_id", params, ('post_id',),
+                             lambda rows: Post.recompute_like_counts({row.post_id for row in rows}))
+        self._delete_batches('friends', "user_id = :user_id OR friend_id = :user_id", params,
+                             ('user_id', 'friend_id'), lambda rows: self._recount_friends(user_id, rows))
+        self._delete_batches('friend_request_table', "sender_id = :user_id OR receiver_id = :user_id", params)
+        self._delete_batches('home_timeline', "user_id = :user_id", params)
+        self._delete_batches('notification_table', "user_id = :user_id", params)
+        self._delete_batches('notification_archive', "user_id = :user_id", params)
+
+        db.session.execute(text("DELETE FROM user_table WHERE id = :user_id"), params)
+        friend_graph.invalidate_after_commit(db.session, user_id)
+        db.session.commit()
+
+    def _recount_friends(self, user_id, rows):
+        friend_ids = {row.friend_id if row.user_id == user_id else row.user_id for row in rows} - {user_id}
+        if friend_ids:
+            User.recompute_friend_counts(friend_ids)
+        friend_graph.invalidate_after_commit(db.session, user_id, *friend_ids)
+
+    # Unread badges of users who lost unread notifications
+    def _recount_unread(self, rows):
+        user_ids = {row.user_id for row in rows if not row.is_read and row.user_id is not None}
+        if not user_ids:
+            return
+        Notification.recompute_unread_counts(user_ids)
+        for user_id, unread_count in db.session.query(User.id, User.unread_count).filter(User.id.in_(user_ids)):
+            hub.publish_after_commit(db.session, user_channel(user_id), 'unread', {'unread_count': unread_count})
+
+
+deleter = Deleter()
+
+
+@jobs.task('delete_post')
+def delete_post(payload):
+    deleter.purge_post(payload['post_id'])
+
+
+@jobs.task('delete_user')
+def delete_user(payload):
+    deleter.purge_user(payload['user_id'])
@@ -0,0 +1,109 @@
+import hashlib
+import time
+from functools import wraps
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+from sqlalchemy import bindparam, text
+from app import db
+from .friend_graph import friend_graph
+from .suggestions import mutual_friend_candidates
+
+
+# Conditional GET for per-user pages. Each view gets a cheap version stamp
+# (a couple of indexed aggregates plus the cached friend sets) that changes
+# whenever the page would; if it matches the client's If-None-Match the view
+# answers 304 without running its queries or templates. Every stamp also
+# covers the navbar (name, unread badge), the query string and the session's
+# CSRF token, and rolls over within the token's lifetime so a cached page
+# never carries an expired token.
+POSTS_STAMP = text("""
+    SELECT COUNT(*), MAX(id), TOTAL(like_count) FROM post_table WHERE user_id IN :user_ids
+""").bindparams(bindparam('user_ids', expanding=True))
+
+PENDING_REQUESTS_STAMP = text("""
+    SELECT COUNT(*), MAX(id) FROM friend_request_table WHERE receiver_id = :user_id AND status = 'pending'
+""")
+
+NOTIFICATIONS_STAMP = text("""
+    SELECT COUNT(*), MAX(id), MAX(timestamp), TOTAL(actor_count) FROM notification_table WHERE user_id = :user_id
+""")
+
+# Names shown on the dashboard: friends (also the feed's authors), suggested
+# users and senders of pending requests
+NAMES_STAMP = text("""
+    SELECT id, username, full_name FROM user_table
+    WHERE id IN :user_ids
+       OR id IN (SELECT sender_id FROM friend_request_table WHERE receiver_id = :user_id AND status = 'pending')
+    ORDER BY id
+""").bindparams(bindparam('user_ids', expanding=True))
+
+UNREAD_NOTIFICATIONS_STAMP = text("""
+    SELECT COUNT(*), MAX(id), MAX(timestamp), TOTAL(actor_count) FROM notification_table WHERE user_id = :user_id AND is_read = 0
+""")
+
+
+def posts_stamp(user_ids):
+    return tuple(db.session.execute(POSTS_STAMP, {'user_ids': sorted(user_ids)}).one())
+
+
+# Dashboard and /api/feed: the feed's posts, the friends list, pending
+# requests, suggestions and the names of everyone shown
+def dashboard_stamp():
+    friend_ids = friend_graph.friend_ids(current_user.id)
+    # Cached, so the dashboard then renders the same suggestions
+    suggestions = tuple(mutual_friend_candidates(current_user.id, current_app.config['SUGGESTIONS_LIMIT'] * 2))
+    names = db.session.execute(NAMES_STAMP, {'user_id': current_user.id,
+                                             'user_ids': sorted(friend_ids | {candidate for candidate, _ in suggestions})})
+    # Values as they are, not hash()ed: str hashes vary per process, make_etag digests them
+    return ('dashboard', sorted(friend_ids), posts_stamp(friend_ids | {current_user.id}),
+            tuple(db.session.execute(PENDING_REQUESTS_STAMP, {'user_id': current_user.id}).one()),
+            suggestions, [tuple(row) for row in names])
+
+
+# Profile page and its posts API: the profile row, friendship and the user's posts
+def profile_stamp(user_id):
+    profile = db.session.execute(
+        text("SELECT username, full_name, bio, friend_count, post_count FROM user_table WHERE id = :user_id"),
+        {'user_id': user_id}
+    ).first()
+    friend_ids = friend_graph.friend_ids(user_id)
+    return ('profile', user_id, tuple(profile or ()), current_user.id in friend_ids,
+            len(friend_ids & friend_graph.friend_ids(current_user.id)), posts_stamp({user_id}))
+
+
+# Notifications page and API: row count, newest row and coalesced like updates
+def notifications_stamp():
+    unread_only = request.args.get('unread_only', '1') != '0'
+    statement = UNREAD_NOTIFICATIONS_STAMP if unread_only else NOTIFICATIONS_STAMP
+    return ('notifications', unread_only, tuple(db.session.execute(statement, {'user_id': current_user.id}).one()))
+
+
+def make_etag(stamp):
+    csrf_lifetime = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600) or 0
+    parts = (stamp, current_user.id, current_user.full_name, current_user.unread_count,
+             request.full_path, session.get('csrf_token'),
+             int(time.time() // (csrf_lifetime / 2)) if csrf_lifetime else None)
+    return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+# Answer GETs with 304 when the stamp still matches the client's copy.
+# Pages with flashed messages waiting are always rendered.
+def conditional(stamp):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET' or session.get('_flashes'):
+                return view(*args, **kwargs)
+
+            etag = make_etag(stamp(**kwargs))
+            if request.if_none_match.contains(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,80 @@
+from sqlalchemy import or_
+from sqlalchemy.orm import joinedload
+from app import db
+from .models import User, Post, PostLikes, friend_association, home_timeline_table
+from .pagination import keyset_page
+from .likes import like_buffer
+from .timeline import home_timeline
+
+
+# Posts written by the user or by anyone in their friends list, newest first
+def feed_query(user_id):
+    friend_ids = db.select(friend_association.c.friend_id)\
+        .where(friend_association.c.user_id == user_id)
+
+    return Post.query.options(joinedload(Post.poster))\
+        .filter(or_(Post.user_id == user_id, Post.user_id.in_(friend_ids)))\
+        .order_by(Post.timestamp.desc(), Post.id.desc())
+
+
+# Posts written by a single user, newest first
+def profile_query(user_id):
+    return Post.query.options(joinedload(Post.poster))\
+        .filter(Post.user_id == user_id)\
+        .order_by(Post.timestamp.desc(), Post.id.desc())
+
+
+# Friends above the fan-out limit, whose posts are not in home_timeline
+def merged_friend_ids(user_id):
+    friend_ids = db.select(friend_association.c.friend_id)\
+        .where(friend_association.c.user_id == user_id)
+    return [friend_id for (friend_id,) in db.session.query(User.id).filter(
+        User.id.in_(friend_ids), User.friend_count > home_timeline.fanout_limit)]
+
+
+# One page of the dashboard feed, starting after the given cursor. With the
+# home timeline enabled this is a single range scan of the user's
+# home_timeline rows, plus posts of any friends merged at read time.
+def feed_page(user_id, cursor=None, limit=20):
+    if not home_timeline.enabled:
+        return keyset_page(feed_query(user_id), Post.timestamp, Post.id, cursor, limit)
+
+    timeline = home_timeline_table.c
+    merged = merged_friend_ids(user_id)
+    if merged:
+        timeline_ids = db.select(timeline.post_id).where(timeline.user_id == user_id)
+        query = Post.query.options(joinedload(Post.poster))\
+            .filter(or_(Post.id.in_(timeline_ids), Post.user_id.in_(merged)))\
+            .order_by(Post.timestamp.desc(), Post.id.desc())
+        return keyset_page(query, Post.timestamp, Post.id, cursor, limit)
+
+    query = Post.query.options(joinedload(Post.poster))\
+        .join(home_timeline_table, timeline.post_id == Post.id)\
+        .filter(timeline.user_id == user_id)\
+        .order_by(timeline.timestamp.desc(), timeline.post_id.desc())
+    return keyset_page(query, timeline.timestamp, timeline.post_id, cursor, limit, row_attrs=('timestamp', 'id'))
+
+
+# One page of a user's profile timeline, starting after the given cursor
+def profile_page(user_id, cursor=None, limit=20):
+    return keyset_page(profile_query(user_id), Post.timestamp, Post.id, cursor, limit)
+
+
+# Viewer's like status for many posts in one query. Likes still waiting in
+# the write-behind buffer are applied to both the status and the counts.
+def like_status(posts, viewer_id):
+    post_ids = [post.id for post in posts]
+    status = dict.fromkeys(post_ids, 0)
+    if not post_ids:
+        return status
+
+    liked = db.session.query(PostLikes.post_id)\
+        .filter(PostLikes.post_id.in_(post_ids), PostLikes.user_id == viewer_id)
+    for (post_id,) in liked:
+        status[post_id] = 1
+
+    if like_buffer.enabled:
+        like_buffer.apply_pending(posts)
+        for post_id, is_liked in like_buffer.pending_status(post_ids, viewer_id).items():
+            status[post_id] = int(is_liked)
+    return status
@@ -0,0 +1,104 @@
+import threading
+import zlib
+from collections import OrderedDict
+from importlib import import_module
+from markupsafe import Markup
+from app import db
+
+
+# Cache of the rendered, viewer-independent part of each post (_post_body.html:
+# title, author, timestamp and text). Entries are keyed by post id and hold
+# the version they were rendered from, computed from the fields the fragment
+# shows, so an edit made anywhere (including the admin panel) renders fresh
+# markup. Deleting a post or renaming its author also drops the old entries
+# after commit. The like count, like button and delete form stay in
+# _post.html and are rendered per viewer on every request. Any backend with
+# get, set and delete can be configured as FRAGMENT_CACHE_BACKEND.
+class LRUBackend:
+    def __init__(self, app=None):
+        self.max_entries = app.config.get('FRAGMENT_CACHE_SIZE', 10000) if app else 10000
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # post_id -> (version, markup)
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FragmentCache:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.backend = LRUBackend()
+        self.app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('FRAGMENT_CACHE', False)
+        module, name = app.config.get('FRAGMENT_CACHE_BACKEND', 'app.fragments.LRUBackend').rsplit('.', 1)
+        self.backend = getattr(import_module(module), name)(app)
+        app.add_template_global(self.render_post, 'post_fragment')
+
+    @staticmethod
+    def version(post):
+        return zlib.crc32(f"{post.title}\0{post.desc}\0{post.timestamp}\0{post.poster.full_name}".encode())
+
+    def _render(self, post):
+        return Markup(self.app.jinja_env.get_template('_post_body.html').render(post=post))
+
+    def render_post(self, post):
+        if not self.enabled:
+            return self._render(post)
+        version = self.version(post)
+        entry = self.backend.get(post.id)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        html = self._render(post)
+        self.backend.set(post.id, (version, html))
+        return html
+
+    def invalidate(self, *post_ids):
+        self.backend.delete(*post_ids)
+
+    # Invalidate once the session's transaction commits, so no other request
+    # can render and cache the old markup in between
+    def invalidate_after_commit(self, session, *post_ids):
+        session.info.setdefault('fragments_stale', set()).update(post_ids)
+
+
+fragment_cache = FragmentCache()
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_changed_posts(session):
+    if session.in_nested_transaction():
+        return # Only a savepoint was released
+    stale = session.info.pop('fragments_stale', None)
+    if stale:
+        fragment_cache.invalidate(*stale)
+
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_changed_posts(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('fragments_stale', None)
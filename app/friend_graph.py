@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import text
+from app import db
+
+
+# Per-process cache of each user's friend ids as a frozenset, so membership
+# and friend-count checks never load the User.friends collection. Entries are
+# dropped after commits that change a friendship and expire after
+# FRIEND_CACHE_TTL seconds to bound staleness across worker processes.
+# Caches derived from friendships register with add_listener to be
+# invalidated for the same users.
+class FriendGraph:
+    def __init__(self, app=None):
+        self.max_users = 10000
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._cache = OrderedDict() # user_id -> (loaded_at, frozenset of friend ids)
+        self._listeners = [] # functions called with the invalidated user ids
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_users = app.config.get('FRIEND_CACHE_SIZE', self.max_users)
+        self.ttl = app.config.get('FRIEND_CACHE_TTL', self.ttl)
+
+    def friend_ids(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._cache.get(user_id)
+            if entry is not None and now - entry[0] < self.ttl:
+                self._cache.move_to_end(user_id)
+                return entry[1]
+
+        # From the primary even in read-only views: the set is shared by every
+        # request of the process, so a lagging replica must not fill it
+        ids = frozenset(db.session.execute(
+            text("SELECT friend_id FROM friends WHERE user_id = :user_id"), {'user_id': user_id},
+            bind_arguments={'bind': db.engine}
+        ).scalars())
+
+        with self._lock:
+            self._cache[user_id] = (now, ids)
+            self._cache.move_to_end(user_id)
+            while len(self._cache) > self.max_users:
+                self._cache.popitem(last=False)
+        return ids
+
+    def is_friend(self, user_id, other_id):
+        return other_id in self.friend_ids(user_id)
+
+    def friend_count(self, user_id):
+        return len(self.friend_ids(user_id))
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._cache.pop(user_id, None)
+        for listener in self._listeners:
+            listener(*user_ids)
+
+    # Invalidate once the session's transaction commits, so no other request
+    # can reload the old friend set in between
+    def invalidate_after_commit(self, session, *user_ids):
+        session.info.setdefault('friend_graph_stale', set()).update(user_ids)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+
+friend_graph = FriendGraph()
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def invalidate_changed_users(session):
+    if session.in_nested_transaction():
+        return # Only a savepoint was released
+    friend_graph.invalidate(*session.info.pop('friend_graph_stale', ()))
+
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_changed_users(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('friend_graph_stale', None)
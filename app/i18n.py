@@ -0,0 +1,12 @@
+from flask import request, session
+from flask_babel import Babel
+
+
+def get_locale():
+    if request.args.get('lang'):
+        session['lang'] = request.args.get('lang')
+    return session.get('lang', 'en')
+
+
+def init_app(app):
+    Babel(app, locale_selector=get_locale)
@@ -0,0 +1,318 @@
+import json
+import os
+import random
+import threading
+import time
+from sqlalchemy import text
+from app import db
+from .metrics import metrics
+
+
+# Durable background jobs. Side effects of a request (writing notifications,
+# fanning a post out to home timelines, deleting a post's or account's rows)
+# are enqueued into job_queue in the request's own transaction, so a job
+# exists exactly when the change that caused it was committed, and run later
+# by JOB_WORKERS threads in each app process and/or by `flask run-jobs`.
+# A failed job is retried up to JOB_MAX_ATTEMPTS times with exponential
+# backoff from JOB_BACKOFF seconds; a job whose worker died is picked up
+# again after JOB_TIMEOUT seconds, so long tasks call jobs.heartbeat() to
+# keep their lease; a job that timed out on its last attempt is failed
+# instead, by the workers' periodic clean-up. Idle workers only read. A job
+# enqueued with an idempotency key is not queued again while one with the
+# same key is waiting or running.
+# Finished jobs are kept for JOB_RETENTION seconds. With JOB_QUEUE_ENABLED
+# off, enqueue runs the task at once.
+ENQUEUE = text("""
+    INSERT OR IGNORE INTO job_queue (task, payload, idempotency_key, status, attempts, max_attempts, run_at, enqueued_at)
+    VALUES (:task, :payload, :key, 'queued', 0, :max_attempts, :run_at, :now)
+""")
+
+# Whether CLAIM would find a job: a plain read, so idle workers polling an
+# empty queue don't write
+DUE = text("""
+    SELECT 1 FROM job_queue
+    WHERE (status = 'queued' AND run_at <= :now)
+       OR (status = 'running' AND started_at < :abandoned_before AND attempts < max_attempts)
+    LIMIT 1
+""")
+
+# Claim the next due job (or one abandoned by a dead worker) in one statement,
+# so two workers, threads or processes, never get the same job
+CLAIM = text("""
+    UPDATE job_queue SET status = 'running', attempts = attempts + 1, started_at = :now, worker = :worker
+    WHERE id = (
+        SELECT id FROM job_queue
+        WHERE (status = 'queued' AND run_at <= :now)
+           OR (status = 'running' AND started_at < :abandoned_before AND attempts < max_attempts)
+        ORDER BY run_at, id LIMIT 1
+    )
+    RETURNING id, task, payload, attempts, max_attempts, enqueued_at
+""")
+
+# Abandoned jobs with no attempts left; run with the clean-up, not every poll
+ABANDON = text("""
+    UPDATE job_queue SET status = 'failed', finished_at = :now, last_error = 'Timed out', idempotency_key = NULL
+    WHERE status = 'running' AND started_at < :abandoned_before AND attempts >= max_attempts
+""")
+
+# Extend the running job's lease while it is still this worker's
+HEARTBEAT = text("UPDATE job_queue SET started_at = :now WHERE id = :id AND worker = :worker AND status = 'running'")
+
+# Finished jobs release their idempotency key
+COMPLETE = text("UPDATE job_queue SET status = 'done', finished_at = :now, last_error = NULL, "
+                "idempotency_key = NULL WHERE id = :id")
+
+RETRY = text("UPDATE job_queue SET status = 'queued', run_at = :run_at, last_error = :error WHERE id = :id")
+
+FAIL = text("UPDATE job_queue SET status = 'failed', finished_at = :now, last_error = :error, "
+            "idempotency_key = NULL WHERE id = :id")
+
+CLEAN_UP = text("""
+    DELETE FROM job_queue WHERE id IN (
+        SELECT id FROM job_queue WHERE status = 'done' AND finished_at < :before LIMIT 500
+    )
+""")
+
+DEPTH = text("""
+    SELECT status, COUNT(*), MIN(CASE WHEN status = 'queued' THEN run_at END)
+    FROM job_queue GROUP BY status
+""")
+
+
+class TaskStats:
+    def __init__(self):
+        self.done = 0
+        self.retried = 0
+        self.failed = 0
+        self.wait_seconds = 0.0 # enqueued until started, jobs that finished
+        self.run_seconds = 0.0
+        self.latency_seconds = 0.0 # enqueued until finished
+
+
+class JobQueue:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self.tasks = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._stats = {} # task -> TaskStats
+        self._running = threading.local() # job id, worker and last heartbeat of this thread
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('JOB_QUEUE_ENABLED', True)
+        self.workers = app.config.get('JOB_WORKERS', 2)
+        self.poll = app.config.get('JOB_POLL_INTERVAL', 1.0)
+        self.max_attempts = app.config.get('JOB_MAX_ATTEMPTS', 5)
+        self.backoff = app.config.get('JOB_BACKOFF', 2)
+        self.backoff_max = app.config.get('JOB_BACKOFF_MAX', 300)
+        self.timeout = app.config.get('JOB_TIMEOUT', 300)
+        self.retention = app.config.get('JOB_RETENTION', 86400)
+        metrics.add_collector(self.metric_lines)
+        if self.enabled and self.workers:
+            # Start workers with the first request so queued jobs left from
+            # before a restart are run
+            app.before_request(self._ensure_workers)
+
+    # Register a function taking the job's payload as the task `name`
+    def task(self, name):
+        def decorator(fn):
+            self.tasks[name] = fn
+            return fn
+        return decorator
+
+    # Queue a task in the session's transaction; it runs once that commits
+    def enqueue(self, task, payload=None, key=None, delay=0, max_attempts=None, session=None):
+        if not self.enabled:
+            self.tasks[task](payload)
+            return
+        session = session or db.session
+        now = time.time()
+        session.execute(ENQUEUE, {'task': task, 'payload': json.dumps(payload), 'key': key,
+                                  'max_attempts': max_attempts or self.max_attempts,
+                                  'run_at': now + delay, 'now': now})
+        session.info['jobs_enqueued'] = True
+
+    def wake(self):
+        if self.workers:
+            self._ensure_workers()
+            self._wake.set()
+
+    def _claim(self, worker):
+        now = time.time()
+        params = {'now': now, 'abandoned_before': now - self.timeout}
+        due = db.session.execute(DUE, params).first()
+        # End the read first: under WAL a read transaction can't become a
+        # write once another worker has committed
+        db.session.rollback()
+        if due is None:
+            return None
+        job = db.session.execute(CLAIM, dict(params, worker=worker)).first()
+        db.session.commit()
+        return job
+
+    # Keep the current job's lease; called by long tasks with each commit.
+    # Writes at most every tenth of JOB_TIMEOUT.
+    def heartbeat(self):
+        job_id = getattr(self._running, 'job_id', None)
+        if job_id is None or time.monotonic() - self._running.beat < self.timeout / 10:
+            return
+        db.session.execute(HEARTBEAT, {'id': job_id, 'worker': self._running.worker, 'now': time.time()})
+        self._running.beat = time.monotonic()
+
+    # Claim and run one job; returns False when none is due
+    def run_one(self, worker='cli'):
+        job = self._claim(worker)
+        if job is None:
+            return False
+
+        started = time.time()
+        self._running.job_id, self._running.worker, self._running.beat = job.id, worker, time.monotonic()
+        try:
+            handler = self.tasks.get(job.task)
+            if handler is None:
+                raise LookupError(f"Unknown task {job.task!r}")
+            handler(json.loads(job.payload))
+            # Marked done in its own transaction after the task returns. A
+            # crash in between runs the task again, so tasks that commit as
+            # they go (deletions in batches) must be safe to resume.
+            finished = time.time()
+            db.session.execute(COMPLETE, {'id': job.id, 'now': finished})
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self._failed(job, e, started)
+        else:
+            with self._lock:
+                stats = self._stats.setdefault(job.task, TaskStats())
+                stats.done += 1
+                stats.wait_seconds += started - job.enqueued_at
+                stats.run_seconds += finished - started
+                stats.latency_seconds += finished - job.enqueued_at
+        finally:
+            self._running.job_id = None
+        return True
+
+    def _failed(self, job, error, started):
+        now = time.time()
+        message = f"{type(error).__name__}: {error}"
+        retry = job.attempts < job.max_attempts
+        if retry:
+            delay = min(self.backoff * 2 ** (job.attempts - 1), self.backoff_max)
+            db.session.execute(RETRY, {'id': job.id, 'error': message,
+                                       'run_at': now + delay * random.uniform(0.8, 1.2)})
+            self.app.logger.warning("Job %d (%s) failed on attempt %d, retrying: %s",
+                                    job.id, job.task, job.attempts, message)
+        else:
+            db.session.execute(FAIL, {'id': job.id, 'error': message, 'now': now})
+            self.app.logger.error("Job %d (%s) failed after %d attempts: %s",
+                                  job.id, job.task, job.attempts, message)
+        db.session.commit()
+        with self._lock:
+            stats = self._stats.setdefault(job.task, TaskStats())
+            if retry:
+                stats.retried += 1
+            else:
+                stats.failed += 1
+            stats.run_seconds += now - started
+
+    # Run due jobs until none is left; returns how many ran
+    def run_pending(self, worker='cli'):
+        ran = 0
+        while self.run_one(worker):
+            ran += 1
+        return ran
+
+    # Fail jobs that timed out on their last attempt
+    def fail_abandoned(self):
+        now = time.time()
+        db.session.execute(ABANDON, {'now': now, 'abandoned_before': now - self.timeout})
+        db.session.commit()
+
+    # Drop finished jobs past JOB_RETENTION
+    def clean_up(self):
+        while db.session.execute(CLEAN_UP, {'before': time.time() - self.retention}).rowcount:
+            db.session.commit()
+        db.session.commit()
+
+    # Worker loop for threads and `flask run-jobs`
+    def work(self, worker, stop=None):
+        cleaned = 0
+        while stop is None or not stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.run_pending(worker)
+                    if time.monotonic() - cleaned > 60:
+                        self.fail_abandoned()
+                        self.clean_up()
+                        cleaned = time.monotonic()
+            except Exception:
+                self.app.logger.exception("Job worker %s failed", worker)
+            self._wake.wait(self.poll)
+            self._wake.clear()
+
+    # Start the worker threads on first use (and again in forked workers)
+    def _ensure_workers(self):
+        if self._threads and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._threads and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._threads = []
+            for i in range(self.workers):
+                name = f'jobs-{os.getpid()}-{i}'
+                thread = threading.Thread(target=self.work, args=(name,), name=name, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    # Queue depth from the database, job counts and latency from this process
+    def metric_lines(self):
+        lines = ["# HELP headnovel_jobs Jobs in the queue by status",
+                 "# TYPE headnovel_jobs gauge"]
+        oldest = None
+        for status, count, first_due in db.session.execute(DEPTH):
+            lines.append(f'headnovel_jobs{{status="{status}"}} {count}')
+            if first_due is not None:
+                oldest = first_due
+        lines += ["# HELP headnovel_jobs_oldest_due_seconds How long the oldest due job has been waiting",
+                  "# TYPE headnovel_jobs_oldest_due_seconds gauge",
+                  f"headnovel_jobs_oldest_due_seconds {max(time.time() - oldest, 0) if oldest else 0:.3f}"]
+
+        with self._lock:
+            stats = {task: vars(task_stats).copy() for task, task_stats in self._stats.items()}
+        for name, attr, description in [
+            ('jobs_done', 'done', 'Jobs finished'),
+            ('jobs_retried', 'retried', 'Job attempts that failed and were retried'),
+            ('jobs_failed', 'failed', 'Jobs that failed on their last attempt'),
+            ('job_wait_seconds', 'wait_seconds', 'Time finished jobs waited in the queue'),
+            ('job_run_seconds', 'run_seconds', 'Time spent running jobs'),
+            ('job_latency_seconds', 'latency_seconds', 'Time from enqueue until finished'),
+        ]:
+            lines.append(f"# HELP headnovel_{name}_total {description}")
+            lines.append(f"# TYPE headnovel_{name}_total counter")
+            for task, task_stats in sorted(stats.items()):
+                lines.append(f'headnovel_{name}_total{{task="{task}"}} {task_stats[attr]}')
+        return lines
+
+
+jobs = JobQueue()
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def wake_workers(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop('jobs_enqueued', False):
+        jobs.wake()
+
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def forget_enqueued(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('jobs_enqueued', None)
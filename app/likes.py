@@ -0,0 +1,194 @@
+import atexit
+import os
+import threading
+from sqlalchemy import bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from .models import User, Post, PostLikes, Notification
+from .pubsub import hub, post_channel
+
+
+# Optional write-behind mode for likes. Toggles are buffered in process and
+# written to post_likes and post_table.like_count in one transaction per batch,
+# flushed every LIKE_FLUSH_INTERVAL seconds or once LIKE_FLUSH_SIZE toggles are
+# pending. Reads overlay pending toggles so counts and buttons stay correct.
+class LikeBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}   # (post_id, user_id) -> [liked in database, liked now]
+        self._flushing = {}  # batch currently being written
+        self._flushes = 0    # finished flushes, to spot one that ends while the database is read
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('LIKE_WRITE_BEHIND', False)
+        self.interval = app.config.get('LIKE_FLUSH_INTERVAL', 0.5)
+        self.size = app.config.get('LIKE_FLUSH_SIZE', 500)
+        if self.enabled:
+            atexit.register(self.stop)
+
+    # Toggle a like; returns the action taken and the post's like count
+    def toggle(self, post_id, user_id):
+        if not self.enabled:
+            return PostLikes.like_post(post_id, user_id)
+
+        key = (post_id, user_id)
+        while True:
+            with self._lock:
+                buffered = key in self._pending or key in self._flushing
+                flushes = self._flushes
+            liked_in_db = None
+            if not buffered:
+                liked_in_db = PostLikes.query.filter_by(post_id=post_id, user_id=user_id).first() is not None
+
+            with self._lock:
+                entry = self._pending.get(key)
+                if entry is None:
+                    flushing = self._flushing.get(key)
+                    if flushing is None and (buffered or flushes != self._flushes):
+                        continue # A flush finished meanwhile; the database read may predate it
+                    base = flushing[1] if flushing else liked_in_db
+                    entry = self._pending[key] = [base, base]
+                entry[1] = not entry[1]
+                liked = entry[1]
+                pending = len(self._pending)
+            break
+
+        self._ensure_worker()
+        if pending >= self.size:
+            self._wake.set()
+
+        like_count = db.session.query(Post.like_count).filter_by(id=post_id).scalar() or 0
+        return ("liked" if liked else "unliked"), like_count + self.count_deltas([post_id])[post_id]
+
+    # Net change each post's like count will see once pending toggles are written
+    def count_deltas(self, post_ids):
+        deltas = dict.fromkeys(post_ids, 0)
+        with self._lock:
+            for batch in (self._flushing, self._pending):
+                for (post_id, _), (base, liked) in batch.items():
+                    if post_id in deltas and base != liked:
+                        deltas[post_id] += 1 if liked else -1
+        return deltas
+
+    # Pending like state of one user for the given posts
+    def pending_status(self, post_ids, user_id):
+        status = {}
+        with self._lock:
+            for batch in (self._flushing, self._pending):
+                for post_id in post_ids:
+                    entry = batch.get((post_id, user_id))
+                    if entry is not None:
+                        status[post_id] = entry[1]
+        return status
+
+    # Adjust loaded posts' like_count in place without marking them dirty
+    def apply_pending(self, posts):
+        if not self.enabled or not posts:
+            return
+        deltas = self.count_deltas([post.id for post in posts])
+        for post in posts:
+            if deltas[post.id]:
+                set_committed_value(post, 'like_count', post.like_count + deltas[post.id])
+
+    # Write all pending toggles in a single transaction
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            batch = self._flushing
+
+        try:
+            liked = [{'post_id': p, 'user_id': u} for (p, u), (base, now) in batch.items() if now and not base]
+            unliked = [{'p': p, 'u': u} for (p, u), (base, now) in batch.items() if base and not now]
+
+            liked = self._existing(liked)
+            if liked:
+                db.session.execute(insert(PostLikes).on_conflict_do_nothing(), liked)
+            if unliked:
+                table = PostLikes.__table__ # Core, the ORM has no bulk DELETE by parameter list
+                db.session.execute(table.delete().where(table.c.post_id == bindparam('p'),
+                                                        table.c.user_id == bindparam('u')), unliked)
+
+            post_ids = {p for p, _ in batch}
+            Post.recompute_like_counts(post_ids)
+            for post_id, like_count in db.session.query(Post.id, Post.like_count).filter(Post.id.in_(post_ids)):
+                hub.publish_after_commit(db.session, post_channel(post_id), 'like', {'post_id': post_id, 'like_count': like_count})
+            self._notify(liked)
+            db.session.commit()
+        except IntegrityError:
+            # Not fixed by retrying, so the batch is dropped rather than
+            # blocking every later flush
+            db.session.rollback()
+            self.app.logger.exception("Dropped %d buffered likes", len(batch))
+            return 0
+        except Exception:
+            db.session.rollback()
+            # Put the batch back unless newer toggles for the same keys arrived
+            with self._lock:
+                for key, entry in batch.items():
+                    self._pending.setdefault(key, entry)
+            raise
+        finally:
+            with self._lock:
+                self._flushing = {}
+                self._flushes += 1
+        return len(batch)
+
+    # Likes whose post and user still exist; either may have been deleted
+    # since the toggle was buffered
+    def _existing(self, liked):
+        if not liked:
+            return liked
+        post_ids = {post_id for (post_id,) in db.session.query(Post.id).filter(
+            Post.id.in_({row['post_id'] for row in liked}), Post.user_id.isnot(None))}
+        user_ids = {user_id for (user_id,) in db.session.query(User.id).filter(
+            User.id.in_({row['user_id'] for row in liked}))}
+        return [row for row in liked if row['post_id'] in post_ids and row['user_id'] in user_ids]
+
+    # Queue like notifications; they are written with the batch's commit
+    def _notify(self, liked):
+        if not liked:
+            return
+        posts = {post.id: post for post in Post.query.filter(Post.id.in_({row['post_id'] for row in liked}))}
+        users = {user.id: user for user in User.query.filter(User.id.in_({row['user_id'] for row in liked}))}
+        for row in liked:
+            Notification.notify_like(posts.get(row['post_id']), users.get(row['user_id']))
+
+    # Start the flush thread on first use (and again in forked workers)
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='like-buffer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                with self.app.app_context():
+                    self.flush()
+            except Exception:
+                self.app.logger.exception("Failed to flush buffered likes")
+
+    def stop(self):
+        with self.app.app_context():
+            self.flush()
+
+
+like_buffer = LikeBuffer()
@@ -0,0 +1,172 @@
+import re
+import threading
+import time
+from collections import Counter
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from app import db
+
+
+# Per-request instrumentation. Engine events count and time every SQL
+# statement, template signals time rendering, and after each request the
+# numbers are added to per-endpoint totals served in Prometheus text format
+# at /metrics. With METRICS_HEADER on, each response also carries a
+# Server-Timing header. A statement repeated METRICS_N_PLUS_ONE_THRESHOLD
+# times in one request (same SQL, different parameters) is logged as a
+# likely N+1 query.
+class EndpointStats:
+    def __init__(self):
+        self.requests = 0
+        self.seconds = 0.0
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.render_seconds = 0.0
+        self.response_bytes = 0
+        self.n_plus_one = 0
+        self.slowest = [] # (seconds, statement), longest first
+
+
+class Metrics:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._endpoints = {} # endpoint -> EndpointStats
+        self._collectors = [] # functions returning more exposition lines
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.enabled = app.config.get('METRICS_ENABLED', False)
+        self.header = app.config.get('METRICS_HEADER', False)
+        self.n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', 5)
+        self.slowest_kept = app.config.get('METRICS_SLOWEST_STATEMENTS', 5)
+        if not self.enabled:
+            return
+
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_execute)
+        before_render_template.connect(self._before_render, app)
+        template_rendered.connect(self._after_render, app)
+        app.before_request(self._start_request)
+        app.after_request(self._finish_request)
+        app.add_url_rule('/metrics', 'metrics', self.render)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and 'metrics_sql' in g:
+            conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.get('metrics_started')
+        if not started or not has_request_context() or 'metrics_sql' not in g:
+            return
+        g.metrics_sql.append((time.perf_counter() - started.pop(), statement))
+
+    def _before_render(self, sender, template, context, **extra):
+        if 'metrics_sql' in g:
+            g.metrics_render_started.append(time.perf_counter())
+
+    def _after_render(self, sender, template, context, **extra):
+        if 'metrics_sql' in g and g.metrics_render_started:
+            elapsed = time.perf_counter() - g.metrics_render_started.pop()
+            # Only count the outermost template; nested renders are inside it
+            if not g.metrics_render_started:
+                g.metrics_render_seconds += elapsed
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+        g.metrics_sql = []
+        g.metrics_render_started = []
+        g.metrics_render_seconds = 0.0
+
+    def _finish_request(self, response):
+        if 'metrics_sql' not in g:
+            return response
+        seconds = time.perf_counter() - g.metrics_started
+        queries = g.metrics_sql
+        sql_seconds = sum(elapsed for elapsed, _ in queries)
+        endpoint = request.endpoint or 'unknown'
+
+        repeated = [(statement, count) for statement, count in Counter(statement for _, statement in queries).items()
+                    if count >= self.n_plus_one_threshold]
+        for statement, count in repeated:
+            self.app.logger.warning("Possible N+1 in %s: statement ran %d times: %s",
+                                    endpoint, count, shorten(statement))
+
+        with self._lock:
+            stats = self._endpoints.setdefault(endpoint, EndpointStats())
+            stats.requests += 1
+            stats.seconds += seconds
+            stats.queries += len(queries)
+            stats.sql_seconds += sql_seconds
+            stats.render_seconds += g.metrics_render_seconds
+            stats.response_bytes += response.content_length or 0
+            stats.n_plus_one += len(repeated)
+            if queries:
+                stats.slowest = sorted(stats.slowest + sorted(queries, reverse=True)[:self.slowest_kept],
+                                       reverse=True)[:self.slowest_kept]
+
+        if self.header:
+            response.headers['Server-Timing'] = (
+                f'sql;dur={sql_seconds * 1000:.1f};desc="{len(queries)} queries", '
+                f'render;dur={g.metrics_render_seconds * 1000:.1f}, '
+                f'total;dur={seconds * 1000:.1f}'
+            )
+        return response
+
+    # Add lines from another subsystem (e.g. the job queue) to /metrics
+    def add_collector(self, collector):
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def snapshot(self):
+        with self._lock:
+            return {endpoint: vars(stats).copy() for endpoint, stats in self._endpoints.items()}
+
+    # Prometheus text exposition format
+    def render(self):
+        counters = [
+            ('requests', 'requests', 'Requests handled'),
+            ('request_seconds', 'seconds', 'Time spent handling requests'),
+            ('sql_queries', 'queries', 'SQL statements executed'),
+            ('sql_seconds', 'sql_seconds', 'Time spent executing SQL'),
+            ('template_seconds', 'render_seconds', 'Time spent rendering templates'),
+            ('response_bytes', 'response_bytes', 'Response body bytes sent'),
+            ('n_plus_one', 'n_plus_one', 'Requests with a statement repeated past the N+1 threshold'),
+        ]
+        snapshot = self.snapshot()
+        lines = []
+        for name, attr, description in counters:
+            lines.append(f"# HELP headnovel_{name}_total {description}")
+            lines.append(f"# TYPE headnovel_{name}_total counter")
+            for endpoint, stats in sorted(snapshot.items()):
+                lines.append(f'headnovel_{name}_total{{endpoint="{label(endpoint)}"}} {stats[attr]}')
+
+        lines.append("# HELP headnovel_slowest_statement_seconds Slowest SQL statements seen per endpoint")
+        lines.append("# TYPE headnovel_slowest_statement_seconds gauge")
+        for endpoint, stats in sorted(snapshot.items()):
+            for seconds, statement in stats['slowest']:
+                lines.append(f'headnovel_slowest_statement_seconds{{endpoint="{label(endpoint)}",'
+                             f'statement="{label(shorten(statement))}"}} {seconds:.6f}')
+        for collector in self._collectors:
+            lines.extend(collector())
+        return '\n'.join(lines) + '\n', 200, {'Content-Type': 'text/plain; version=0.0.4'}
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+
+
+def shorten(statement, length=200):
+    statement = re.sub(r'\s+', ' ', statement).strip()
+    return statement if len(statement) <= length else statement[:length - 3] + '...'
+
+
+def label(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+metrics = Metrics()
@@ -1,14 +1,89 @@
 from app import db, login_manager
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import IntegrityError
+from .pagination import keyset_page
+from .pubsub import hub, user_channel, post_channel
+from .friend_graph import friend_graph
+from .timeline import home_timeline
+from .passwords import hasher
+from .jobs import jobs
+
+# SQLite stores db.func.now() as "YYYY-MM-DD HH:MM:SS", so bind datetimes in the
+# same format or comparisons against stored timestamps (keyset cursors) break
+Timestamp = db.DateTime().with_variant(
+    sqlite.DATETIME(storage_format="%(year)04d-%(month)02d-%(day)02d %(hour)02d:%(minute)02d:%(second)02d"),
+    'sqlite'
+)
 
 friend_association = db.Table(
     'friends',
-    db.Column('user_id', db.Integer, db.ForeignKey('user_table.id'), index=True),
-    db.Column('friend_id', db.Integer, db.ForeignKey('user_table.id'), index=True),
+    db.Column('user_id', db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'), index=True),
+    db.Column('friend_id', db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'), index=True),
     db.UniqueConstraint('user_id', 'friend_id', name='unique_friendship')
 )
 
+# Materialized home timelines: one row per post in each reader's dashboard,
+# written on post creation when HOME_TIMELINE is enabled (see app/timeline.py)
+home_timeline_table = db.Table(
+    'home_timeline',
+    db.Column('user_id', db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('post_id', db.Integer, db.ForeignKey('post_table.id', ondelete='CASCADE'), primary_key=True, index=True),
+    db.Column('timestamp', Timestamp, nullable=False),
+    db.Index('ix_home_timeline_user_id_timestamp_post_id', 'user_id', 'timestamp', 'post_id')
+)
+
+# Per-user summary of notifications removed by the retention purge: one row
+# per user and kind ('' when the kind is unknown), see app/retention.py
+notification_archive_table = db.Table(
+    'notification_archive',
+    db.Column('user_id', db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('kind', db.String(20), primary_key=True),
+    db.Column('notifications', db.Integer, nullable=False),
+    db.Column('unread', db.Integer, nullable=False),
+    db.Column('actors', db.Integer, nullable=False),
+    db.Column('first_timestamp', Timestamp, nullable=False),
+    db.Column('last_timestamp', Timestamp, nullable=False)
+)
+
+# Users counted in an unread like notification's actor_count, so a liker who
+# toggles their like again is not counted twice
+notification_actors_table = db.Table(
+    'notification_actors',
+    db.Column('notification_id', db.Integer, db.ForeignKey('notification_table.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('actor_id', db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'), primary_key=True, index=True)
+)
+
+# Count a liker once; likers already counted, and accounts deleted since, add no row
+ADD_NOTIFICATION_ACTOR = db.text("""
+    INSERT OR IGNORE INTO notification_actors (notification_id, actor_id)
+    SELECT :notification_id, id FROM user_table WHERE id = :actor_id
+""")
+
+# Durable background jobs (see app/jobs.py). Times are Unix timestamps.
+job_queue_table = db.Table(
+    'job_queue',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('task', db.String(50), nullable=False),
+    db.Column('payload', db.Text),
+    db.Column('idempotency_key', db.String(100), unique=True),
+    db.Column('status', db.String(10), nullable=False), # queued, running, done or failed
+    db.Column('attempts', db.Integer, nullable=False),
+    db.Column('max_attempts', db.Integer, nullable=False),
+    db.Column('run_at', db.Float, nullable=False),
+    db.Column('enqueued_at', db.Float, nullable=False),
+    db.Column('started_at', db.Float),
+    db.Column('finished_at', db.Float),
+    db.Column('worker', db.String(50)),
+    db.Column('last_error', db.Text),
+    db.Index('ix_job_queue_status_run_at', 'status', 'run_at')
+)
+
+# Stored in place of the password hash of an account being deleted; no
+# password verifies against it
+DISABLED_PASSWORD = '!'
+
 class User(UserMixin, db.Model):
     __tablename__ = "user_table"
     id = db.Column(db.Integer, primary_key=True)
@@ -18,6 +93,7 @@ class User(UserMixin, db.Model):
     bio = db.Column(db.String(60))
     friend_count = db.Column(db.Integer, default=0)
     post_count = db.Column(db.Integer, default=0)
+    unread_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
     
     # Relationships
     friends = db.relationship(
@@ -28,66 +104,109 @@ class User(UserMixin, db.Model):
     )
     
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hasher.hash(password)
         
+    # Hashes made with outdated parameters are replaced on a successful check;
+    # the caller commits the upgrade
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        if not hasher.verify(self.password, password):
+            return False
+        if hasher.needs_rehash(self.password):
+            self.password = hasher.hash(password)
+        return True
     
     @staticmethod
-    def search_username(keyword):
-        return User.query.filter(User.username.ilike(f"%{keyword}")).all()
+    def search_username(keyword, limit=20):
+        from .search import search_users  # search indexes this model
+        return search_users(keyword, limit)
     
     def accept_friend_request(self, request_id):
         request = FriendRequest.query.get(request_id)
-        if request and request.status == "pending":
-            request.status = "accepted"
-            sender = User.query.get(request.sender_id)
-            
-            # Handle reciprocal requests
-            reciprocal = FriendRequest.query.filter_by(
-                sender_id=self.id, receiver_id=sender.id, status="pending"
-            ).first()
-            if reciprocal:
-                reciprocal.status = "accepted"
-            
-            # Update friendship and count
-            if sender not in self.friends:
-                self.friends.append(sender)
-            if self not in sender.friends:
-                sender.friends.append(self)
-            sender.friend_count += 1
-            self.friend_count += 1
-            db.session.commit()
-            
-            # Notify both sender and receiver
-            Notification.create_notification(sender.id, f"You are now friends with {self.full_name}.")
-            Notification.create_notification(self.id, f"You are now friends with {sender.full_name}.")
-            
-            return "Friend request accepted"
-        elif request.status != "pending":
-            return "Request already accepted/declined"
-        else:
+        if request is None or request.receiver_id != self.id:
             return "Invalid request or status"
+        if request.status != "pending":
+            return "Request already accepted/declined"
+        self.accept_friend_requests([request_id])
+        return "Friend request accepted"
+
+    # Accept many of this user's pending requests in one transaction: statuses
+    # (and requests this user sent the other way) are updated in bulk, the new
+    # friendships are inserted with one executemany and both sides' counters
+    # are recomputed in a single UPDATE. Returns the number accepted.
+    def accept_friend_requests(self, request_ids):
+        requests = FriendRequest.query.options(db.joinedload(FriendRequest.sender))\
+            .filter(FriendRequest.id.in_(request_ids), FriendRequest.receiver_id == self.id,
+                    FriendRequest.is_pending()).all()
+        if not requests:
+            return 0
+        senders = {request.sender_id: request.sender for request in requests}
+
+        db.session.execute(db.update(FriendRequest).where(FriendRequest.id.in_([request.id for request in requests]))
+                           .values(status="accepted"), execution_options={'synchronize_session': 'fetch'})
+        # Reciprocal requests
+        db.session.execute(db.update(FriendRequest).where(FriendRequest.sender_id == self.id,
+                                                          FriendRequest.receiver_id.in_(senders),
+                                                          FriendRequest.is_pending())
+                           .values(status="accepted"), execution_options={'synchronize_session': 'fetch'})
+
+        # Checked against the table, not friend_graph: its per-process cache
+        # can be stale when another worker changed the friendship
+        already_friends = set(db.session.execute(
+            db.select(friend_association.c.friend_id).where(friend_association.c.user_id == self.id,
+                                                            friend_association.c.friend_id.in_(senders))).scalars())
+        new_friends = [sender for sender_id, sender in senders.items() if sender_id not in already_friends]
+        db.session.execute(insert(friend_association).on_conflict_do_nothing(), [
+            row for sender in senders.values() for row in (
+                {'user_id': self.id, 'friend_id': sender.id},
+                {'user_id': sender.id, 'friend_id': self.id})
+        ])
+        changed = [self.id] + list(senders)
+        User.recompute_friend_counts(changed)
+        for user in [self] + list(senders.values()):
+            db.session.expire(user, ['friend_count'])
+        friend_graph.invalidate_after_commit(db.session, *changed)
+        for sender in new_friends:
+            home_timeline.add_friendship(db.session, self.id, sender.id)
+
+        # Notify both sides, written with the friendships in one commit
+        for sender in new_friends:
+            Notification.create_notification(sender.id, f"You are now friends with {self.full_name}.", kind="friend_accepted")
+            Notification.create_notification(self.id, f"You are now friends with {sender.full_name}.", kind="friend_accepted")
+        db.session.commit()
+        return len(requests)
+
+    # Decline many of this user's pending requests in one UPDATE
+    def decline_friend_requests(self, request_ids):
+        declined = db.session.execute(
+            db.update(FriendRequest).where(FriendRequest.id.in_(request_ids), FriendRequest.receiver_id == self.id,
+                                           FriendRequest.is_pending())
+            .values(status="declined"), execution_options={'synchronize_session': 'fetch'}).rowcount
+        db.session.commit()
+        return declined
         
     def remove_friend(self, user_id):
         user = User.query.get(user_id)
         if not user:
             return "User not found"
     
-        if user not in self.friends:
-            return "User not in friends list"
-        
         try:
             if user.id == self.id:
                 return "Cannot remove yourself from friends list"
             
-            self.friends.remove(user)
-            user.friends.remove(self)
+            # The DELETE decides, not friend_graph's per-process cache
+            removed = db.session.execute(friend_association.delete().where(
+                ((friend_association.c.user_id == self.id) & (friend_association.c.friend_id == user.id)) |
+                ((friend_association.c.user_id == user.id) & (friend_association.c.friend_id == self.id))
+            )).rowcount
+            friend_graph.invalidate_after_commit(db.session, self.id, user.id)
+            if not removed:
+                db.session.commit()
+                return "User not in friends list"
             
-            if user.friend_count > 0:
-                user.friend_count -= 1
-            if self.friend_count > 0:
-                self.friend_count -= 1
+            User.recompute_friend_counts([self.id, user.id])
+            db.session.expire(self, ['friend_count'])
+            db.session.expire(user, ['friend_count'])
+            home_timeline.remove_friendship(db.session, self.id, user.id)
             db.session.commit()
             
             return "User removed from friends list"
@@ -96,23 +215,73 @@ class User(UserMixin, db.Model):
             return f"An error occured: {str(e)}"
             
     def is_friends_with(self, user_id):
-        return any(friend.id == user_id for friend in self.friends)
-    
+        return friend_graph.is_friend(self.id, user_id)
+
+    # The account can no longer log in; its posts, likes, friendships and
+    # notifications are deleted in the background
+    def delete_account(self):
+        from .deletion import deleter  # deletion works on this model
+        deleter.delete_user(self.id)
+
+    @staticmethod
+    def recompute_friend_counts(user_ids=None):
+        # Rebuild friend_count from the friends table in a single UPDATE
+        friend_count = db.select(db.func.count())\
+            .where(friend_association.c.user_id == User.id).scalar_subquery()
+        query = db.update(User).values(friend_count=friend_count)
+        if user_ids is not None:
+            query = query.where(User.id.in_(user_ids))
+        return db.session.execute(query, execution_options={'synchronize_session': False}).rowcount
+
+    @staticmethod
+    def recompute_post_counts(user_ids=None):
+        # Rebuild post_count from post_table in a single UPDATE
+        post_count = db.select(db.func.count(Post.id))\
+            .where(Post.user_id == User.id).scalar_subquery()
+        query = db.update(User).values(post_count=post_count)
+        if user_ids is not None:
+            query = query.where(User.id.in_(user_ids))
+        return db.session.execute(query, execution_options={'synchronize_session': False}).rowcount
+
     @staticmethod
     def get_pending_requests(user_id):
-        return FriendRequest.query.filter(receiver_id=user_id, status="pending").order_by(FriendRequest.timestamp.desc()).all()
+        return FriendRequest.pending_for(user_id).all()
     
 class FriendRequest(db.Model):
     __tablename__ = "friend_request_table"
+    __table_args__ = (
+        db.Index('ix_friend_request_table_receiver_id_status', 'receiver_id', 'status'),
+        db.Index('ix_friend_request_table_sender_id_receiver_id_status', 'sender_id', 'receiver_id', 'status'),
+        # Inbox: pending requests of a receiver, newest first
+        db.Index('ix_friend_request_table_pending', 'receiver_id', 'timestamp',
+                 sqlite_where=db.text("status = 'pending'")),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    sender_id = db.Column(db.Integer, db.ForeignKey('user_table.id'))
-    receiver_id = db.Column(db.Integer, db.ForeignKey('user_table.id'))
+    sender_id = db.Column(db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'))
+    receiver_id = db.Column(db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'))
     status = db.Column(db.String(20), default="pending") # pending, accepted or declined
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    timestamp = db.Column(Timestamp, default=db.func.now())
     
     sender = db.relationship('User', foreign_keys=[sender_id])
     receiver = db.relationship('User', foreign_keys=[receiver_id])
     
+    # The status is inlined rather than bound so SQLite can prove the query
+    # only reads pending rows and use the partial index
+    @staticmethod
+    def is_pending():
+        return FriendRequest.status == db.literal_column("'pending'")
+
+    @staticmethod
+    def pending_for(receiver_id):
+        return FriendRequest.query.options(db.joinedload(FriendRequest.sender))\
+            .filter(FriendRequest.receiver_id == receiver_id, FriendRequest.is_pending())\
+            .order_by(FriendRequest.timestamp.desc(), FriendRequest.id.desc())
+
+    # One page of a user's pending requests with their senders loaded
+    @staticmethod
+    def get_pending_page(receiver_id, cursor=None, limit=20):
+        return keyset_page(FriendRequest.pending_for(receiver_id), FriendRequest.timestamp, FriendRequest.id, cursor, limit)
+
     @staticmethod
     def send_request(sender_id, receiver_id):
         if sender_id == receiver_id:
@@ -122,11 +291,11 @@ class FriendRequest(db.Model):
         
         request = FriendRequest(sender_id=sender_id, receiver_id=receiver_id)
         db.session.add(request)
-        db.session.commit()
         
         # Notify receiver
         sender = User.query.get(sender_id)
-        Notification.create_notification(receiver_id, f"{sender.username} sent you a friend request.")
+        Notification.create_notification(receiver_id, f"{sender.username} sent you a friend request.", kind="friend_request")
+        db.session.commit()
         
         return "Friend request sent"
     
@@ -144,69 +313,201 @@ class FriendRequest(db.Model):
             
 class Post(db.Model):
     __tablename__ = "post_table"
+    __table_args__ = (
+        db.Index('ix_post_table_user_id_timestamp', 'user_id', 'timestamp'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user_table.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'))
     title = db.Column(db.String(30), index=True, unique=True)
     desc = db.Column(db.String(500))
-    likes = db.Column(db.Integer, default=0)
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    like_count = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    timestamp = db.Column(Timestamp, default=db.func.now())
     
     # Relationships
-    poster = db.relationship('User', backref='posts')
-    likes = db.relationship('PostLikes', backref='post', lazy='dynamic')
+    poster = db.relationship('User', backref=db.backref('posts', passive_deletes=True))
+    likes = db.relationship('PostLikes', backref='post', lazy='dynamic', passive_deletes=True)
     
+    # The post disappears at once; its likes and notifications are deleted in
+    # the background
     @staticmethod
     def delete_post(post_id):
-        post = Post.query.get(post_id)
-        if post:
-            db.session.delete(post)
-            db.session.commit()
-            return "Post deleted successfully."
-        return "Post not found."
+        from .deletion import deleter  # deletion works on this model
+        if Post.query.get(post_id) is None:
+            return "Post not found."
+        deleter.delete_post(post_id)
+        return "Post deleted successfully."
+    
+    @staticmethod
+    def recompute_like_counts(post_ids=None):
+        # Rebuild like_count from post_likes in a single UPDATE
+        like_count = db.select(db.func.count(PostLikes.id))\
+            .where(PostLikes.post_id == Post.id).scalar_subquery()
+        query = db.update(Post).values(like_count=like_count)
+        if post_ids is not None:
+            query = query.where(Post.id.in_(post_ids))
+        return db.session.execute(query, execution_options={'synchronize_session': False}).rowcount
     
 class PostLikes(db.Model):
     __tablename__ = "post_likes"
+    __table_args__ = (
+        db.UniqueConstraint('post_id', 'user_id', name='unique_post_like'),
+        db.Index('ix_post_likes_user_id', 'user_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    post_id = db.Column(db.Integer, db.ForeignKey('post_table.id'))
-    user_id = db.Column(db.Integer, db.ForeignKey('user_table.id'))
+    post_id = db.Column(db.Integer, db.ForeignKey('post_table.id', ondelete='CASCADE'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'))
     is_liked = db.Column(db.Boolean, default=True)
     
+    user = db.relationship('User')
+    
     @staticmethod
     def like_post(post_id, user_id):
-        like = PostLikes.query.filter_by(post_id=post_id, user_id=user_id).first()
-        post = Post.query.get(post_id)
-        
-        if not like:
-            like = PostLikes(post_id=post_id, user_id=user_id)
-            db.session.add(like)
-            post.likes += 1
-            db.session.commit()
-            
-            # Notify poster
-            if post.user_id != user_id: # Avoid self-notifications
-                liker = User.query.get(user_id)
-                Notification.create_notification(post.user_id, f"{liker.username} liked your post: '{post.title}'.")
-            return "Post liked" 
+        # Toggle the like and adjust the counter in the same transaction.
+        # Returns the action taken and the post's new like count.
+        if PostLikes.query.filter_by(post_id=post_id, user_id=user_id).delete(synchronize_session=False):
+            action, delta = "unliked", -1
         else:
-            db.session.delete(like)
-            post = Post.query.get(post_id)
-            post.likes -= 1
-            db.session.commit()
-            return "Post unliked"
+            try:
+                with db.session.begin_nested():
+                    db.session.add(PostLikes(post_id=post_id, user_id=user_id))
+                action, delta = "liked", 1
+            except IntegrityError:
+                # A concurrent request already inserted the same like
+                action, delta = "liked", 0
+        
+        if delta:
+            Post.query.filter_by(id=post_id)\
+                .update({Post.like_count: Post.like_count + delta}, synchronize_session=False)
+        like_count = db.session.query(Post.like_count).filter_by(id=post_id).scalar()
+        hub.publish_after_commit(db.session, post_channel(post_id), 'like', {'post_id': post_id, 'like_count': like_count})
+        
+        # Notify poster
+        if action == "liked" and delta:
+            Notification.notify_like(Post.query.get(post_id), User.query.get(user_id))
+        db.session.commit()
+        return action, like_count
     
 class Notification(db.Model):
     __tablename__ = "notification_table"
+    __table_args__ = (
+        db.Index('ix_notification_table_user_id_is_read_timestamp', 'user_id', 'is_read', 'timestamp'),
+        db.Index('ix_notification_table_post_id', 'post_id'),
+    )
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user_table.id'))
+    user_id = db.Column(db.Integer, db.ForeignKey('user_table.id', ondelete='CASCADE'))
     message = db.Column(db.String(200))
-    timestamp = db.Column(db.DateTime, default=db.func.now())
+    timestamp = db.Column(Timestamp, default=db.func.now())
     is_read = db.Column(db.Boolean, default=False)
+    kind = db.Column(db.String(20)) # friend_request, friend_accepted or like
+    post_id = db.Column(db.Integer, db.ForeignKey('post_table.id', ondelete='CASCADE'))
+    actor_count = db.Column(db.Integer, default=1, server_default='1', nullable=False)
     
+    user = db.relationship('User')
+    post = db.relationship('Post')
+    
+    # Notifications are queued in the session's outbox and written in bulk
+    # together with the change that triggered them when the session commits
     @staticmethod
-    def create_notification(user_id, message):
-        notification = Notification(user_id=user_id, message=message)
-        db.session.add(notification)
-        db.session.commit()
+    def create_notification(user_id, message, kind=None, post_id=None):
+        outbox = db.session.info.setdefault('notification_outbox', [])
+        outbox.append({'user_id': user_id, 'message': message, 'kind': kind, 'post_id': post_id})
+    
+    @staticmethod
+    def notify_like(post, liker):
+        if not post or not liker or post.user_id == liker.id: # Avoid self-notifications
+            return
+        if post.user_id is None: # Deleted, waiting to be purged
+            return
+        outbox = db.session.info.setdefault('notification_outbox', [])
+        outbox.append({'user_id': post.user_id, 'kind': 'like', 'post_id': post.id, 'actor': liker.username,
+                       'actor_id': liker.id, 'title': post.title})
+    
+    @staticmethod
+    def like_message(actor, actor_count, title):
+        if actor_count == 1:
+            return f"{actor} liked your post: '{title}'."
+        others = actor_count - 1
+        return f"{actor} and {others} other{'s' if others != 1 else ''} liked your post: '{title}'."
+    
+    @staticmethod
+    def flush_outbox(session, outbox):
+        if not outbox:
+            return
+        
+        rows = [entry for entry in outbox if entry['kind'] != 'like']
+        
+        # Coalesce likes into one unread row per post: "alice and 12 others liked your post".
+        # Each liker is counted once, however often they toggle the like.
+        likes = {}
+        for entry in outbox:
+            if entry['kind'] == 'like':
+                like = likes.setdefault(entry['post_id'], dict(entry, actors={}))
+                like['actors'].pop(entry.get('actor_id'), None) # Latest liker last
+                like['actors'][entry.get('actor_id')] = entry['actor']
+        
+        pushed = []
+        created = []
+        if likes:
+            existing = {post_id: (notification_id, actor_count)
+                        for post_id, notification_id, actor_count in session.query(
+                            Notification.post_id, Notification.id, Notification.actor_count).filter(
+                Notification.kind == 'like',
+                Notification.is_read == False,
+                Notification.post_id.in_(likes)
+            )}
+            # A post's first unread like creates its row; its message is set below
+            created = [like for post_id, like in likes.items() if post_id not in existing]
+            if created:
+                existing.update({post_id: (notification_id, 0) for post_id, notification_id in session.execute(
+                    db.insert(Notification).returning(Notification.post_id, Notification.id, sort_by_parameter_order=True),
+                    [{'user_id': like['user_id'], 'message': '', 'kind': 'like', 'post_id': like['post_id'],
+                      'actor_count': 0} for like in created])})
+            
+            updates = []
+            for post_id, like in likes.items():
+                notification_id, counted = existing[post_id]
+                # One keyed insert per liker, so the cost doesn't grow with the post's likers
+                new_actors = [actor for actor_id, actor in like['actors'].items()
+                              if actor_id is None or session.execute(ADD_NOTIFICATION_ACTOR, {
+                                  'notification_id': notification_id, 'actor_id': actor_id}).rowcount]
+                if not new_actors:
+                    continue
+                actor_count = counted + len(new_actors)
+                message = Notification.like_message(new_actors[-1], actor_count, like['title'])
+                updates.append({'n': notification_id, 'message': message, 'actor_count': actor_count})
+                pushed.append({'user_id': like['user_id'], 'message': message, 'kind': 'like', 'post_id': post_id})
+            if updates:
+                table = Notification.__table__
+                session.execute(
+                    db.update(table).where(table.c.id == db.bindparam('n'))
+                    .values(message=db.bindparam('message'), actor_count=db.bindparam('actor_count'), timestamp=db.func.now()),
+                    updates
+                )
+        
+        if rows:
+            session.execute(db.insert(Notification), [dict(row, actor_count=1) for row in rows])
+            pushed.extend(rows)
+        
+        if rows or created:
+            # Keep each recipient's cached unread count in step
+            recipients = {}
+            for row in rows + created:
+                recipients[row['user_id']] = recipients.get(row['user_id'], 0) + 1
+            users = User.__table__
+            session.execute(
+                db.update(users).where(users.c.id == db.bindparam('u'))
+                .values(unread_count=users.c.unread_count + db.bindparam('n')),
+                [{'u': user_id, 'n': n} for user_id, n in recipients.items()]
+            )
+        
+        # Push the new notifications and unread counts to connected clients
+        if pushed:
+            unread = dict(session.query(User.id, User.unread_count).filter(User.id.in_({row['user_id'] for row in pushed})))
+            for row in pushed:
+                hub.publish_after_commit(session, user_channel(row['user_id']), 'notification', {
+                    'message': row['message'], 'kind': row['kind'], 'post_id': row['post_id'],
+                    'unread_count': unread.get(row['user_id'], 0)
+                })
         
     @staticmethod
     def get_notifications(user_id, unread_only=True):
@@ -215,10 +516,68 @@ class Notification(db.Model):
             query = query.filter_by(is_read=False)
         return query.order_by(Notification.timestamp.desc()).all()
     
-    def mark_as_read(self):
-        self.is_read = True
+    @staticmethod
+    def get_notifications_page(user_id, cursor=None, limit=20, unread_only=True):
+        query = Notification.query.filter_by(user_id=user_id)
+        if unread_only:
+            query = query.filter_by(is_read=False)
+        query = query.order_by(Notification.timestamp.desc(), Notification.id.desc())
+        return keyset_page(query, Notification.timestamp, Notification.id, cursor, limit)
+    
+    @staticmethod
+    def mark_read(user_id, notification_ids=None):
+        # Mark all (or the given) unread notifications of a user as read in one UPDATE
+        query = db.update(Notification).where(Notification.user_id == user_id, Notification.is_read == False)
+        if notification_ids is not None:
+            query = query.where(Notification.id.in_(notification_ids))
+        marked = db.session.execute(query.values(is_read=True), execution_options={'synchronize_session': False}).rowcount
+        if marked:
+            User.query.filter_by(id=user_id)\
+                .update({User.unread_count: db.func.max(User.unread_count - marked, 0)}, synchronize_session=False)
+            unread_count = db.session.query(User.unread_count).filter_by(id=user_id).scalar()
+            hub.publish_after_commit(db.session, user_channel(user_id), 'unread', {'unread_count': unread_count})
         db.session.commit()
+        return marked
+    
+    @staticmethod
+    def recompute_unread_counts(user_ids=None):
+        # Rebuild unread_count from notification_table in a single UPDATE
+        unread = db.select(db.func.count(Notification.id))\
+            .where(Notification.user_id == User.id, Notification.is_read == False).scalar_subquery()
+        query = db.update(User).values(unread_count=unread)
+        if user_ids is not None:
+            query = query.where(User.id.in_(user_ids))
+        return db.session.execute(query, execution_options={'synchronize_session': False}).rowcount
+    
+    def mark_as_read(self):
+        Notification.mark_read(self.user_id, [self.id])
+
+# The outbox is written by a background job queued in the same transaction,
+# or right away when the job queue is disabled
+@db.event.listens_for(db.session, 'before_commit')
+def write_notification_outbox(session):
+    if session.in_nested_transaction():
+        return
+    outbox = session.info.pop('notification_outbox', None)
+    if not outbox:
+        return
+    if jobs.enabled:
+        jobs.enqueue('notifications', outbox, session=session)
+    else:
+        Notification.flush_outbox(session, outbox)
+
+@jobs.task('notifications')
+def write_notifications(outbox):
+    Notification.flush_outbox(db.session, outbox)
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_notification_outbox(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('notification_outbox', None)
         
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
\ No newline at end of file
+    user = User.query.get(int(user_id))
+    if user is not None and user.password != DISABLED_PASSWORD:
+        return user
+    return None
\ No newline at end of file
@@ -0,0 +1,36 @@
+from datetime import datetime
+from sqlalchemy import literal, tuple_
+
+
+# Cursors are "<timestamp>_<id>" of the last row on the previous page
+def encode_cursor(timestamp, row_id):
+    return f"{timestamp.isoformat()}_{row_id}"
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, row_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (AttributeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor!r}")
+
+
+# Fetch one page of a query ordered by (timestamp desc, id desc).
+# Returns the rows and the cursor for the next page (None on the last page).
+# row_attrs names the attributes of each row holding the cursor values when
+# they differ from the column keys (e.g. ordering by a joined table).
+def keyset_page(query, timestamp_column, id_column, cursor=None, limit=20, row_attrs=None):
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        # Bind the cursor with the column types so timestamps use the stored format
+        query = query.filter(tuple_(timestamp_column, id_column) <
+                             tuple_(literal(timestamp, timestamp_column.type), literal(row_id, id_column.type)))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    timestamp_attr, id_attr = row_attrs or (timestamp_column.key, id_column.key)
+    return rows, encode_cursor(getattr(last, timestamp_attr), getattr(last, id_attr))
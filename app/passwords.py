@@ -0,0 +1,61 @@
+import atexit
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusy(Exception):
+    pass
+
+
+# Password hashing on a small bounded pool. Hashes are deliberately slow, so
+# at most PASSWORD_HASH_WORKERS run at once per process (hashlib releases the
+# GIL while hashing, so other requests keep being served) and at most
+# PASSWORD_HASH_QUEUE more may wait; beyond that callers get HasherBusy
+# straight away instead of piling up behind a login burst. Stored hashes made
+# with other parameters than PASSWORD_HASH_METHOD are upgraded on login.
+class PasswordHasher:
+    def __init__(self, app=None):
+        self.method = 'scrypt:32768:8:1'
+        self.timeout = 10
+        self._executor = None
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', self.method)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', self.timeout)
+        workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hasher')
+        self._slots = threading.BoundedSemaphore(workers + app.config.get('PASSWORD_HASH_QUEUE', 16))
+        atexit.register(self._executor.shutdown, wait=False)
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusy("Too many password checks in progress")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise HasherBusy("Password check timed out")
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        return self._run(check_password_hash, stored_hash, password)
+
+    # Whether a stored hash was made with other parameters than the current ones
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split('$', 1)[0] != self.method
+
+
+hasher = PasswordHasher()
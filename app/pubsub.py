@@ -0,0 +1,105 @@
+import queue
+import threading
+from importlib import import_module
+from app import db
+
+
+# Subscriptions receive messages published to any of their channels
+class Subscription:
+    def __init__(self, backend, channels, maxsize=100):
+        self.backend = backend
+        self.channels = channels
+        self.queue = queue.Queue(maxsize=maxsize)
+
+    def deliver(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            pass # Drop messages for clients that can't keep up
+
+    # Next message, or None if nothing arrived within the timeout
+    def get(self, timeout=None):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.backend.unsubscribe(self)
+
+
+# Backends move messages between publishers and subscribers. Anything with the
+# same publish/subscribe/unsubscribe methods can be configured as PUBSUB_BACKEND,
+# e.g. one backed by a message broker to fan out across worker processes.
+class LocalBackend:
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._subscribers = {} # channel -> set of subscriptions
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def subscribe(self, channels):
+        subscription = Subscription(self, channels)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+
+class Hub:
+    def __init__(self, app=None):
+        self.backend = LocalBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        module, name = app.config.get('PUBSUB_BACKEND', 'app.pubsub.LocalBackend').rsplit('.', 1)
+        self.backend = getattr(import_module(module), name)(app)
+
+    def publish(self, channel, event, data):
+        self.backend.publish(channel, {'event': event, 'data': data})
+
+    def subscribe(self, channels):
+        return self.backend.subscribe(channels)
+
+    # Publish once the session's current transaction commits; dropped on rollback
+    def publish_after_commit(self, session, channel, event, data):
+        session.info.setdefault('pubsub_pending', []).append((channel, event, data))
+
+
+hub = Hub()
+
+
+def user_channel(user_id):
+    return f"user:{user_id}"
+
+
+def post_channel(post_id):
+    return f"post:{post_id}"
+
+
+@db.event.listens_for(db.session, 'after_commit')
+def publish_pending(session):
+    if session.in_nested_transaction():
+        return # Only a savepoint was released
+    for channel, event, data in session.info.pop('pubsub_pending', ()):
+        hub.publish(channel, event, data)
+
+
+@db.event.listens_for(db.session, 'after_soft_rollback')
+def discard_pending(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('pubsub_pending', None)
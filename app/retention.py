@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from sqlalchemy import bindparam, text
+from app import db
+from .models import Notification, User
+from .pubsub import hub, user_channel
+
+
+# Retention for notification_table. Read notifications older than
+# NOTIFICATION_READ_TTL_DAYS and unread ones older than
+# NOTIFICATION_UNREAD_TTL_DAYS are deleted NOTIFICATION_PURGE_BATCH rows per
+# transaction, with a short pause between batches, so the purge never holds
+# SQLite's write lock for long. With NOTIFICATION_ARCHIVE the deleted rows
+# are first rolled up into notification_archive (counts per user and kind).
+# Runs from `flask purge-notifications` and, with NOTIFICATION_PURGE_INTERVAL
+# set, every that many seconds in a background thread of each process.
+
+# Expired rows after a given id; a TTL of NULL never matches
+SELECT_EXPIRED = text("""
+    SELECT id, user_id, is_read FROM notification_table
+    WHERE id > :after AND (
+        (is_read = 1 AND timestamp < datetime('now', :read_age)) OR
+        (is_read = 0 AND timestamp < datetime('now', :unread_age))
+    )
+    ORDER BY id LIMIT :batch_size
+""")
+
+ARCHIVE = text("""
+    INSERT INTO notification_archive (user_id, kind, notifications, unread, actors, first_timestamp, last_timestamp)
+    SELECT user_id, COALESCE(kind, ''), COUNT(*), SUM(is_read = 0), SUM(actor_count), MIN(timestamp), MAX(timestamp)
+    FROM notification_table
+    WHERE id IN :ids AND user_id IS NOT NULL
+    GROUP BY user_id, COALESCE(kind, '')
+    ON CONFLICT (user_id, kind) DO UPDATE SET
+        notifications = notifications + excluded.notifications,
+        unread = unread + excluded.unread,
+        actors = actors + excluded.actors,
+        first_timestamp = MIN(first_timestamp, excluded.first_timestamp),
+        last_timestamp = MAX(last_timestamp, excluded.last_timestamp)
+""").bindparams(bindparam('ids', expanding=True))
+
+DELETE = text("DELETE FROM notification_table WHERE id IN :ids").bindparams(bindparam('ids', expanding=True))
+
+
+def age(days):
+    return None if days is None else f'-{days} days'
+
+
+class NotificationRetention:
+    def __init__(self, app=None):
+        self.app = None
+        self.read_ttl = 30
+        self.unread_ttl = 180
+        self.batch_size = 500
+        self.pause = 0.05
+        self.archive = True
+        self.interval = 0
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.read_ttl = app.config.get('NOTIFICATION_READ_TTL_DAYS', 30)
+        self.unread_ttl = app.config.get('NOTIFICATION_UNREAD_TTL_DAYS', 180)
+        self.batch_size = app.config.get('NOTIFICATION_PURGE_BATCH', 500)
+        self.pause = app.config.get('NOTIFICATION_PURGE_PAUSE', 0.05)
+        self.archive = app.config.get('NOTIFICATION_ARCHIVE', True)
+        self.interval = app.config.get('NOTIFICATION_PURGE_INTERVAL', 0)
+        if self.interval:
+            app.before_request(self._ensure_worker)
+
+    # Delete expired notifications batch by batch, one commit per batch.
+    # Returns the number of rows deleted.
+    def purge(self, batch_size=None, archive=None):
+        batch_size = batch_size or self.batch_size
+        archive = self.archive if archive is None else archive
+        params = {'read_age': age(self.read_ttl), 'unread_age': age(self.unread_ttl), 'batch_size': batch_size}
+        deleted, after = 0, 0
+        while True:
+            rows = db.session.execute(SELECT_EXPIRED, dict(params, after=after)).all()
+            if not rows:
+                return deleted
+            self._purge_batch(rows, archive)
+            deleted += len(rows)
+            after = rows[-1].id
+            if len(rows) < batch_size:
+                return deleted
+            time.sleep(self.pause) # Let waiting writers take the lock
+
+    def _purge_batch(self, rows, archive):
+        ids = [row.id for row in rows]
+        try:
+            if archive:
+                db.session.execute(ARCHIVE, {'ids': ids})
+            db.session.execute(DELETE, {'ids': ids})
+
+            # Unread badges of users who lost unread notifications
+            user_ids = {row.user_id for row in rows if not row.is_read and row.user_id is not None}
+            if user_ids:
+                Notification.recompute_unread_counts(user_ids)
+                for user_id, unread_count in db.session.query(User.id, User.unread_count).filter(User.id.in_(user_ids)):
+                    hub.publish_after_commit(db.session, user_channel(user_id), 'unread', {'unread_count': unread_count})
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    # Start the scheduled purge on the first request (and again in forked workers)
+    def _ensure_worker(self):
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='notification-retention', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                with self.app.app_context():
+                    deleted = self.purge()
+                if deleted:
+                    self.app.logger.info("Purged %d expired notifications", deleted)
+            except Exception:
+                self.app.logger.exception("Failed to purge expired notifications")
+
+
+retention = NotificationRetention()
@@ -0,0 +1,105 @@
+import random
+import re
+import time
+import flask
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.elements import TextClause
+
+
+# Read/write splitting. Views marked @read_only run their SELECTs on one of
+# the READ_REPLICAS binds (keys of SQLALCHEMY_BINDS, each with its own pool
+# options) for GET requests; everything else, and every query of a session
+# that has written in its current transaction, goes to the primary. After a
+# request commits a write, its client reads from the primary for
+# READ_YOUR_WRITES_SECONDS, so users see their own changes while the
+# replicas catch up. CLI commands, background threads and the per-process
+# caches (friend sets, suggestions) always use the primary. With no replicas
+# configured every query goes to the primary.
+READ_SQL = re.compile(r'\s*SELECT\b', re.IGNORECASE)
+
+PRIMARY_UNTIL = '_primary_until' # client session key
+
+
+def is_read(clause):
+    if isinstance(clause, TextClause):
+        return bool(READ_SQL.match(clause.text))
+    return clause is not None and clause.is_select
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            if not self._flushing and is_read(clause):
+                replica = None if self.info.get('wrote') else router.read_bind()
+                if replica is not None:
+                    return self._db.engines[replica]
+            elif self._flushing or clause is not None:
+                self.info['wrote'] = True
+        return super().get_bind(mapper, clause, bind, **kwargs)
+
+
+class ReplicaRouter:
+    def __init__(self, app=None):
+        self.replicas = []
+        self.sticky_seconds = 5
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.replicas = list(app.config.get('READ_REPLICAS', []))
+        self.sticky_seconds = app.config.get('READ_YOUR_WRITES_SECONDS', 5)
+        missing = set(self.replicas) - set(app.config.get('SQLALCHEMY_BINDS', {}))
+        if missing:
+            raise ValueError(f"READ_REPLICAS not in SQLALCHEMY_BINDS: {', '.join(sorted(missing))}")
+        if self.replicas:
+            app.before_request(self._choose_bind)
+
+    # Pick a replica for this request, or None to stay on the primary
+    def _choose_bind(self):
+        g.read_bind = None
+        if request.method not in ('GET', 'HEAD'):
+            return
+        view = current_app.view_functions.get(request.endpoint)
+        if not getattr(view, 'read_only', False):
+            return
+        if flask.session.get(PRIMARY_UNTIL, 0) > time.time():
+            return
+        g.read_bind = random.choice(self.replicas)
+
+    def read_bind(self):
+        if not has_request_context():
+            return None
+        return g.get('read_bind')
+
+    # The request wrote: read from the primary for the rest of it and, for
+    # this client, for the next READ_YOUR_WRITES_SECONDS
+    def wrote(self):
+        if not self.replicas or not has_request_context():
+            return
+        g.read_bind = None
+        flask.session[PRIMARY_UNTIL] = time.time() + self.sticky_seconds
+
+
+router = ReplicaRouter()
+
+
+# Mark a view as safe to serve from a replica; place it under @bp.route
+def read_only(view):
+    view.read_only = True
+    return view
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def stick_to_primary(session):
+    if session.in_nested_transaction():
+        return
+    if session.info.pop('wrote', False):
+        router.wrote()
+
+
+@event.listens_for(RoutingSession, 'after_soft_rollback')
+def forget_writes(session, previous_transaction):
+    if not session.in_transaction():
+        session.info.pop('wrote', None)
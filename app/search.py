@@ -0,0 +1,98 @@
+import re
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app import db
+from .models import User
+
+
+# Full-text index over user_table (username, full_name, bio). It is an FTS5
+# external-content table kept in sync by triggers, so registrations, profile
+# edits and bulk imports are all indexed without extra work in the views.
+# Prefix indexes on 2 and 3 characters make "as you type" queries cheap.
+INDEX_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+    "username, full_name, bio, content='user_table', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+
+    "CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON user_table BEGIN "
+    "INSERT INTO user_search(rowid, username, full_name, bio) "
+    "VALUES (new.id, new.username, new.full_name, new.bio); END",
+
+    "CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON user_table BEGIN "
+    "INSERT INTO user_search(user_search, rowid, username, full_name, bio) "
+    "VALUES ('delete', old.id, old.username, old.full_name, old.bio); END",
+
+    "CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username, full_name, bio ON user_table BEGIN "
+    "INSERT INTO user_search(user_search, rowid, username, full_name, bio) "
+    "VALUES ('delete', old.id, old.username, old.full_name, old.bio); "
+    "INSERT INTO user_search(rowid, username, full_name, bio) "
+    "VALUES (new.id, new.username, new.full_name, new.bio); END",
+]
+
+DROP_DDL = [
+    "DROP TRIGGER IF EXISTS user_search_update",
+    "DROP TRIGGER IF EXISTS user_search_delete",
+    "DROP TRIGGER IF EXISTS user_search_insert",
+    "DROP TABLE IF EXISTS user_search",
+]
+
+# Column weights for bm25(): username matches rank above full_name, then bio
+RANK = "bm25(user_search, 10.0, 5.0, 1.0)"
+
+_available = None
+
+
+def create_index(connection):
+    for statement in INDEX_DDL:
+        connection.exec_driver_sql(statement)
+
+
+def rebuild_index(connection):
+    connection.exec_driver_sql("INSERT INTO user_search(user_search) VALUES ('rebuild')")
+
+
+@event.listens_for(User.__table__, 'after_create')
+def create_index_with_table(target, connection, **kw):
+    if connection.dialect.name != 'sqlite':
+        return
+    try:
+        create_index(connection)
+    except OperationalError:
+        pass # SQLite built without FTS5; searches fall back to LIKE
+
+
+def index_available():
+    global _available
+    if _available is None:
+        _available = db.engine.dialect.name == 'sqlite' and db.session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_search'")
+        ).first() is not None
+    return _available
+
+
+# Turn user input into an FTS5 query where every word is a prefix match
+def match_query(query):
+    words = re.findall(r'\w+', query)
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+# Users matching every word of the query, best matches first
+def search_users(query, limit=20):
+    match = match_query(query)
+    if not match:
+        return []
+
+    if not index_available():
+        pattern = f"{query.strip()}%"
+        return User.query.filter(User.username.ilike(pattern) | User.full_name.ilike(pattern))\
+            .order_by(User.username).limit(limit).all()
+
+    ids = db.session.execute(
+        text(f"SELECT rowid FROM user_search WHERE user_search MATCH :match ORDER BY {RANK} LIMIT :limit"),
+        {'match': match, 'limit': limit}
+    ).scalars().all()
+    if not ids:
+        return []
+
+    users = {user.id: user for user in User.query.filter(User.id.in_(ids))}
+    return [users[user_id] for user_id in ids if user_id in users]
@@ -1,7 +1,8 @@
 $(document).ready(function () {
     let csrfToken = $('meta[name="csrf-token"]').attr('content');
 
-    $('.like-button').click(function (event) {
+    // Delegated so buttons on posts loaded by infinite scroll work too
+    $(document).on('click', '.like-button', function (event) {
         event.preventDefault(); // Prevent default behavior
 
         let button = $(this); // Reference to the clicked button
@@ -36,4 +37,77 @@ $(document).ready(function () {
             }
         });
     });
+
+    // Infinite scroll: load the next page of posts when nearing the bottom
+    let postsContainer = $('.posts-container');
+    let loading = false;
+
+    function loadNextPage() {
+        let nextUrl = postsContainer.attr('data-next-url');
+        if (loading || !nextUrl) {
+            return;
+        }
+        loading = true;
+
+        $.getJSON(nextUrl)
+            .done(function (response) {
+                if (response.status === 'success') {
+                    postsContainer.append(response.html);
+                    postsContainer.attr('data-next-url', response.next_url || '');
+                    subscribe(); // Listen for like counts of the new posts too
+                } else {
+                    console.error('Error:', response.message);
+                }
+            })
+            .fail(function (error) {
+                console.error('Error loading more posts:', error);
+            })
+            .always(function () {
+                loading = false;
+            });
+    }
+
+    $(window).on('scroll', function () {
+        if ($(window).scrollTop() + $(window).height() >= $(document).height() - 300) {
+            loadNextPage();
+        }
+    });
+
+    // Live updates: like counts for posts on screen and new notifications
+    let eventSource = null;
+
+    function subscribe() {
+        if (!window.EventSource) {
+            return;
+        }
+        if (eventSource) {
+            eventSource.close();
+        }
+
+        let postIds = $('.like-button').map(function () {
+            return $(this).data('post-id');
+        }).get();
+        eventSource = new EventSource('/stream?posts=' + postIds.join(','));
+
+        eventSource.addEventListener('like', function (event) {
+            let data = JSON.parse(event.data);
+            $('#like-count-' + data.post_id).text(data.like_count);
+        });
+
+        eventSource.addEventListener('notification', function (event) {
+            updateUnreadBadge(JSON.parse(event.data).unread_count);
+        });
+
+        eventSource.addEventListener('unread', function (event) {
+            updateUnreadBadge(JSON.parse(event.data).unread_count);
+        });
+    }
+
+    function updateUnreadBadge(count) {
+        let badge = $('.unread-badge');
+        badge.text(count);
+        badge.toggle(count > 0);
+    }
+
+    subscribe();
 });
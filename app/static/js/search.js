@@ -0,0 +1,42 @@
+$(document).ready(function () {
+    let input = $('.search-input');
+    let results = $('.results');
+    let timer = null;
+    let lastQuery = input.val();
+
+    // Search as you type, waiting for a short pause between keystrokes
+    input.on('input', function () {
+        clearTimeout(timer);
+        timer = setTimeout(function () {
+            let query = input.val().trim();
+            if (!query || query === lastQuery) {
+                return;
+            }
+            lastQuery = query;
+
+            $.getJSON('/api/search_users', { query: query })
+                .done(function (response) {
+                    // Ignore responses for queries the user has already typed past
+                    if (response.status !== 'success' || query !== lastQuery) {
+                        return;
+                    }
+                    results.empty();
+                    if (!response.users.length) {
+                        results.append($('<p>').text('No users found for "' + query + '".'));
+                    }
+                    response.users.forEach(function (user) {
+                        let name = $('<div class="profile-name">')
+                            .append($('<b>').text(user.full_name))
+                            .append(document.createTextNode(' (@' + user.username + ')'));
+                        results.append(
+                            $('<a class="profile-card-link">').attr('href', user.url)
+                                .append($('<div class="profile-card">').append(name))
+                        );
+                    });
+                })
+                .fail(function (error) {
+                    console.error('Error searching users:', error);
+                });
+        }, 150);
+    });
+});
@@ -0,0 +1,130 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import bindparam, text
+from sqlalchemy.exc import OperationalError
+from app import db
+from .models import User
+from .friend_graph import friend_graph
+
+
+# "People you may know": friends of friends ranked by how many friends they
+# share with the user, computed by one grouped query over the friends table.
+# To keep within SUGGESTION_TIME_BUDGET_MS for users with thousands of
+# friends, only SUGGESTION_FRIEND_SAMPLE of their friends are expanded, the
+# query is interrupted when it runs over budget, and results are cached for
+# SUGGESTION_CACHE_TTL seconds (a stale entry is served on timeout).
+ALL_FRIENDS_QUERY = text("""
+    SELECT f2.friend_id, COUNT(*) AS mutual
+    FROM friends AS f1 JOIN friends AS f2 ON f2.user_id = f1.friend_id
+    WHERE f1.user_id = :user_id
+      AND f2.friend_id != :user_id
+      AND f2.friend_id NOT IN (SELECT friend_id FROM friends WHERE user_id = :user_id)
+    GROUP BY f2.friend_id
+    ORDER BY mutual DESC, f2.friend_id
+    LIMIT :limit
+""")
+
+SAMPLED_FRIENDS_QUERY = text("""
+    SELECT f2.friend_id, COUNT(*) AS mutual
+    FROM friends AS f2
+    WHERE f2.user_id IN :friend_ids
+      AND f2.friend_id != :user_id
+      AND f2.friend_id NOT IN (SELECT friend_id FROM friends WHERE user_id = :user_id)
+    GROUP BY f2.friend_id
+    ORDER BY mutual DESC, f2.friend_id
+    LIMIT :limit
+""").bindparams(bindparam('friend_ids', expanding=True))
+
+
+class SuggestionCache:
+    def __init__(self, max_users=10000):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # user_id -> (computed_at, [(candidate_id, mutual)])
+
+    def get(self, user_id):
+        with self._lock:
+            return self._entries.get(user_id)
+
+    def set(self, user_id, suggestions):
+        with self._lock:
+            self._entries[user_id] = (time.monotonic(), suggestions)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+
+cache = SuggestionCache()
+friend_graph.add_listener(cache.invalidate) # Accepted, removed and purged friendships
+
+
+# Run a query on the session's primary connection (results are cached for
+# the whole process, so never from a lagging replica), interrupting it past
+# the deadline
+def execute_within(statement, params, budget_ms):
+    connection = db.session.connection(bind_arguments={'bind': db.engine})
+    raw = connection.connection.driver_connection
+    if connection.dialect.name != 'sqlite' or not budget_ms:
+        return connection.execute(statement, params).all()
+
+    deadline = time.monotonic() + budget_ms / 1000
+    raw.set_progress_handler(lambda: time.monotonic() > deadline, 1000)
+    try:
+        return connection.execute(statement, params).all()
+    finally:
+        raw.set_progress_handler(None, 0)
+
+
+# Ranked (candidate_id, mutual_friend_count) pairs for a user
+def mutual_friend_candidates(user_id, limit=10):
+    cached = cache.get(user_id)
+    if cached and time.monotonic() - cached[0] < current_app.config['SUGGESTION_CACHE_TTL']:
+        return cached[1][:limit]
+
+    friend_ids = friend_graph.friend_ids(user_id)
+    if not friend_ids:
+        return []
+
+    sample = current_app.config['SUGGESTION_FRIEND_SAMPLE']
+    # Fetch a few extra so results can still be filtered after caching
+    params = {'user_id': user_id, 'limit': limit * 2}
+    if len(friend_ids) <= sample:
+        statement = ALL_FRIENDS_QUERY
+    else:
+        statement = SAMPLED_FRIENDS_QUERY
+        params['friend_ids'] = sorted(friend_ids)[:sample]
+
+    try:
+        rows = execute_within(statement, params, current_app.config['SUGGESTION_TIME_BUDGET_MS'])
+    except OperationalError as e:
+        if 'interrupted' not in str(e):
+            raise
+        # Over budget: serve the last known suggestions, however old
+        return cached[1][:limit] if cached else []
+
+    suggestions = [(candidate_id, mutual) for candidate_id, mutual in rows]
+    cache.set(user_id, suggestions)
+    return suggestions[:limit]
+
+
+# Users to suggest, each paired with their mutual friend count
+def suggest_friends(user_id, limit=5):
+    friend_ids = friend_graph.friend_ids(user_id)
+    candidates = [(candidate_id, mutual) for candidate_id, mutual in mutual_friend_candidates(user_id, limit * 2)
+                  if candidate_id not in friend_ids][:limit]
+    if not candidates:
+        return []
+
+    users = {user.id: user for user in User.query.filter(User.id.in_([candidate_id for candidate_id, _ in candidates]))}
+    return [(users[candidate_id], mutual) for candidate_id, mutual in candidates if candidate_id in users]
+
+
+def mutual_friend_count(user_id, other_id):
+    return len(friend_graph.friend_ids(user_id) & friend_graph.friend_ids(other_id))
@@ -0,0 +1,124 @@
+from sqlalchemy import text
+from app import db
+from .jobs import jobs
+
+
+# Optional fan-out-on-write home timelines. When HOME_TIMELINE is enabled a
+# new post is copied into the home_timeline rows of its author and each of
+# their friends, so the dashboard reads one indexed range per user instead of
+# joining post_table against friends. Authors with more than
+# HOME_TIMELINE_FANOUT_LIMIT friends are not fanned out; readers merge their
+# posts at read time (see feed.py). Friendship changes and post deletions
+# keep the rows in step, and `flask backfill-home-timeline` rebuilds them.
+FAN_OUT_POST = text("""
+    INSERT OR IGNORE INTO home_timeline (user_id, post_id, timestamp)
+    SELECT readers.user_id, post_table.id, post_table.timestamp
+    FROM post_table JOIN (
+        SELECT :author_id AS user_id
+        UNION SELECT friend_id FROM friends WHERE user_id = :author_id AND :fan_out
+    ) AS readers
+    WHERE post_table.id = :post_id AND post_table.user_id = :author_id
+""")
+
+# Every post of an author, copied into one reader's timeline
+COPY_AUTHOR_POSTS = text("""
+    INSERT OR IGNORE INTO home_timeline (user_id, post_id, timestamp)
+    SELECT :reader_id, id, timestamp FROM post_table WHERE user_id = :author_id
+""")
+
+REMOVE_AUTHOR_POSTS = text("""
+    DELETE FROM home_timeline
+    WHERE user_id = :reader_id
+      AND post_id IN (SELECT id FROM post_table WHERE user_id = :author_id)
+""")
+
+# Every post of an author, copied into all of their friends' timelines
+FAN_OUT_AUTHOR = text("""
+    INSERT OR IGNORE INTO home_timeline (user_id, post_id, timestamp)
+    SELECT friends.friend_id, post_table.id, post_table.timestamp
+    FROM post_table JOIN friends ON friends.user_id = post_table.user_id
+    WHERE post_table.user_id = :author_id
+""")
+
+BACKFILL = [
+    "DELETE FROM home_timeline",
+    "INSERT INTO home_timeline (user_id, post_id, timestamp) "
+    "SELECT user_id, id, timestamp FROM post_table WHERE user_id IS NOT NULL",
+    "INSERT OR IGNORE INTO home_timeline (user_id, post_id, timestamp) "
+    "SELECT friends.friend_id, post_table.id, post_table.timestamp "
+    "FROM post_table JOIN friends ON friends.user_id = post_table.user_id "
+    "JOIN user_table ON user_table.id = post_table.user_id "
+    "WHERE user_table.friend_count <= :fanout_limit",
+]
+
+
+class HomeTimeline:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.fanout_limit = 1000
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.enabled = app.config.get('HOME_TIMELINE', False)
+        self.fanout_limit = app.config.get('HOME_TIMELINE_FANOUT_LIMIT', self.fanout_limit)
+
+    def _friend_count(self, session, user_id):
+        return session.execute(text("SELECT friend_count FROM user_table WHERE id = :user_id"),
+                               {'user_id': user_id}).scalar() or 0
+
+    def fans_out(self, session, user_id):
+        return self._friend_count(session, user_id) <= self.fanout_limit
+
+    # Write a new post into its author's timeline now and into their friends'
+    # timelines from a background job
+    def add_post(self, session, post):
+        if not self.enabled:
+            return
+        session.flush()
+        session.execute(FAN_OUT_POST, {'post_id': post.id, 'author_id': post.user_id, 'fan_out': False})
+        jobs.enqueue('fan_out_post', {'post_id': post.id, 'author_id': post.user_id}, session=session)
+
+    def fan_out_post(self, session, post_id, author_id):
+        session.execute(FAN_OUT_POST, {'post_id': post_id, 'author_id': author_id,
+                                       'fan_out': self.fans_out(session, author_id)})
+
+    def remove_post(self, session, post_id):
+        if not self.enabled:
+            return
+        session.execute(text("DELETE FROM home_timeline WHERE post_id = :post_id"), {'post_id': post_id})
+
+    # Two users became friends: each sees the other's posts, unless the other
+    # is above the fan-out limit and merged at read time anyway
+    def add_friendship(self, session, user_id, friend_id):
+        if not self.enabled:
+            return
+        session.flush()
+        for reader_id, author_id in ((user_id, friend_id), (friend_id, user_id)):
+            if self.fans_out(session, author_id):
+                session.execute(COPY_AUTHOR_POSTS, {'reader_id': reader_id, 'author_id': author_id})
+
+    def remove_friendship(self, session, user_id, friend_id):
+        if not self.enabled:
+            return
+        session.flush()
+        for reader_id, author_id in ((user_id, friend_id), (friend_id, user_id)):
+            session.execute(REMOVE_AUTHOR_POSTS, {'reader_id': reader_id, 'author_id': author_id})
+            # An author who just dropped back to the limit is no longer merged
+            # at read time, so their posts have to be fanned out now
+            if self._friend_count(session, author_id) == self.fanout_limit:
+                session.execute(FAN_OUT_AUTHOR, {'author_id': author_id})
+
+    # Rebuild every timeline from post_table and friends
+    def backfill(self, session):
+        for statement in BACKFILL:
+            session.execute(text(statement), {'fanout_limit': self.fanout_limit})
+        return session.execute(text("SELECT COUNT(*) FROM home_timeline")).scalar()
+
+
+home_timeline = HomeTimeline()
+
+
+@jobs.task('fan_out_post')
+def fan_out_post(payload):
+    home_timeline.fan_out_post(db.session, payload['post_id'], payload['author_id'])
@@ -1,29 +1,34 @@
-from flask import render_template, request, redirect, url_for, flash, jsonify
+import json
+from flask import Blueprint, abort, current_app, render_template, request, redirect, url_for, flash, jsonify, Response, stream_with_context
 from flask_login import login_user, login_required, logout_user, current_user
-from flask_admin.contrib.sqla import ModelView
-from app import app, db, admin
-from werkzeug.security import generate_password_hash, check_password_hash
-from .models import User, FriendRequest, Post, PostLikes, Notification, friend_association
+from app import db
+from .models import User, FriendRequest, Post, Notification, friend_association
 from .forms import RegisterForm, LoginForm, PostForm, EditProfileForm
-
-# Admin view for database
-admin.add_view(ModelView(User, db.session))
-admin.add_view(ModelView(FriendRequest, db.session))
-admin.add_view(ModelView(Post, db.session))
-admin.add_view(ModelView(PostLikes, db.session))
-admin.add_view(ModelView(Notification, db.session))
-
-@app.route('/')
+from .feed import feed_page, profile_page, like_status
+from .likes import like_buffer
+from . import search
+from .friend_graph import friend_graph
+from .timeline import home_timeline
+from .fragments import fragment_cache
+from .etags import conditional, dashboard_stamp, profile_stamp, notifications_stamp
+from .passwords import HasherBusy
+from .suggestions import suggest_friends, mutual_friend_count
+from .pubsub import hub, user_channel, post_channel
+from .routing import read_only
+
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
 def index():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
-    return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 # User registration
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     form = RegisterForm()
     if form.validate_on_submit():
         username = form.username.data
@@ -33,93 +38,104 @@ def register():
 
         if User.query.filter_by(username=username).first():
             flash("Username already exists", 'danger')
-            return redirect(url_for('register'))
+            return redirect(url_for('main.register'))
 
-        user = User(username=username, password=generate_password_hash(password), full_name=full_name, bio=bio)
+        user = User(username=username, full_name=full_name, bio=bio)
+        try:
+            user.set_password(password)
+        except HasherBusy:
+            flash("The server is busy, please try again in a moment.", 'danger')
+            return render_template('register.html', form=form), 503
         db.session.add(user)
         db.session.commit()
         flash("Registration successful", 'success')
-        return redirect(url_for('login'))
+        return redirect(url_for('main.login'))
 
     return render_template('register.html', form=form)
 
 # User login
-@app.route('/login', methods=['GET', 'POST'])
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if current_user.is_authenticated:
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
     form = LoginForm()
     if form.validate_on_submit():
         username = form.username.data
         password = form.password.data
 
         user = User.query.filter_by(username=username).first()
-        if user and check_password_hash(user.password, password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HasherBusy:
+            flash("The server is busy, please try again in a moment.", 'danger')
+            return render_template('login.html', form=form), 503
+        if valid:
+            db.session.commit()  # Keep a hash upgraded by check_password
             login_user(user)  # Login the user with Flask-Login
             flash("Login successful", 'success')
-            return redirect(url_for('dashboard'))
+            return redirect(url_for('main.dashboard'))
         else:
             flash("Login failed. Check your username or password.", 'danger')
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
 
     return render_template('login.html', form=form)
 
 # User logout
-@app.route('/logout')
+@bp.route('/logout')
 def logout():
     logout_user()  # Log out the user with Flask-Login
     flash("You have been logged out.", 'success')
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
 
 # Dashboard
-@app.route('/dashboard', methods=['GET', 'POST'])
+@bp.route('/dashboard', methods=['GET', 'POST'])
+@read_only
 @login_required
+@conditional(dashboard_stamp)
 def dashboard():
-    # Fetch current user's posts
-    user_posts = Post.query.filter_by(user_id=current_user.id).all()
+    # Fetch the first page of current user's and friends' posts, most recent first
+    posts, next_cursor = feed_page(current_user.id, limit=current_app.config['POSTS_PER_PAGE'])
 
-    # Fetch friends' posts
-    friend_posts = Post.query.join(friend_association, (friend_association.c.friend_id == Post.user_id))\
-        .filter(friend_association.c.user_id == current_user.id)\
-        .filter(Post.user_id != current_user.id).all()
-    
-    # Combine both user and friend posts
-    posts = user_posts + friend_posts
-    
-    # Sort the posts by most recent
-    posts.sort(key=lambda post: post.timestamp, reverse=True)
-    
-    post_like_counts = {}
-    post_like_status = {}
-    
-    # Fetch the like count and status for each post
-    for post in posts:
-        post_like_counts[post.id] = PostLikes.query.filter_by(post_id=post.id).count()
-        post_like_status[post.id] = PostLikes.query.filter_by(post_id=post.id, user_id=current_user.id).count()
+    # Fetch the current user's like status for every post at once
+    post_like_status = like_status(posts, current_user.id)
     
     # Fetch the current user's friends
     friends = User.query.join(friend_association, friend_association.c.friend_id == User.id).filter(friend_association.c.user_id == current_user.id).all()
     
-    # Fetch the current user's pending friend requests
-    pending_requests = FriendRequest.query.filter_by(receiver_id=current_user.id, status='pending').all()
+    # Fetch the first page of the current user's pending friend requests
+    pending_requests, _ = FriendRequest.get_pending_page(current_user.id, limit=current_app.config['FRIEND_REQUESTS_PER_PAGE'])
+    
+    # Friends of friends the current user may know
+    suggestions = suggest_friends(current_user.id, limit=current_app.config['SUGGESTIONS_LIMIT'])
     
     return render_template('dashboard.html',
                            posts=posts,
-                           post_like_counts=post_like_counts,
+                           next_cursor=next_cursor,
                            post_like_status=post_like_status,
                            friends=friends,
                            pending_requests=pending_requests,
+                           suggestions=suggestions,
                            user_fullname=current_user.full_name)
 
-@app.route('/edit', methods=['GET', 'POST'])
+@bp.route('/edit', methods=['GET', 'POST'])
 @login_required
 def edit():
     form = EditProfileForm(obj=current_user)  # Pre-fill form with the current user's data
 
     if form.validate_on_submit():  # Check if the form is valid on submission
+        # Cached posts show the author's name, so re-render them after a rename
+        if form.full_name.data != current_user.full_name:
+            post_ids = [post_id for (post_id,) in db.session.query(Post.id).filter_by(user_id=current_user.id)]
+            fragment_cache.invalidate_after_commit(db.session, *post_ids)
+
         # Update the current user's information
         current_user.username = form.username.data
-        current_user.set_password(form.password.data)  # Make sure to hash passwords
+        if form.password.data:  # Only hash when a new password was given
+            try:
+                current_user.set_password(form.password.data)
+            except HasherBusy:
+                flash("The server is busy, please try again in a moment.", 'danger')
+                return render_template('edit.html', form=form), 503
         current_user.full_name = form.full_name.data
         current_user.bio = form.bio.data
 
@@ -127,7 +143,7 @@ def edit():
         try:
             db.session.commit()
             flash("Profile updated successfully!", "success")
-            return redirect(url_for('user_profile', user_id=current_user.id))
+            return redirect(url_for('main.user_profile', user_id=current_user.id))
         except Exception as e:
             db.session.rollback()
             flash("An error occurred while updating your profile.", "danger")
@@ -137,60 +153,119 @@ def edit():
     return render_template('edit.html', form=form)
 
 # Search for user
-@app.route('/search_users', methods=['GET'])
+@bp.route('/search_users', methods=['GET'])
+@read_only
 @login_required
 def search_users():
     query = request.args.get('query', '')  # Get the search query from the URL
     users = []  # Default to an empty list
 
     if query:
-        # Search the User model by username or full_name (case insensitive)
-        users = User.query.filter(
-            (User.username.ilike(f"%{query}%")) | (User.full_name.ilike(f"%{query}%"))
-        ).all()
+        # Ranked full-text search over username, full name and bio
+        users = search.search_users(query, limit=current_app.config['SEARCH_RESULTS_LIMIT'])
 
     return render_template('search_users.html', query=query, users=users)
 
+# Search as you type
+@bp.route('/api/search_users', methods=['GET'])
+@read_only
+@login_required
+def search_users_api():
+    users = search.search_users(request.args.get('query', ''), limit=current_app.config['SEARCH_SUGGESTIONS_LIMIT'])
+    return jsonify({'status': 'success',
+                    'users': [{'id': user.id,
+                               'username': user.username,
+                               'full_name': user.full_name,
+                               'url': url_for('main.user_profile', user_id=user.id)}
+                              for user in users]})
+
 # Send friend request
-@app.route('/send_friend_request/<int:receiver_id>', methods=['POST'])
+@bp.route('/send_friend_request/<int:receiver_id>', methods=['POST'])
 @login_required
 def send_friend_request(receiver_id):
     sender_id = current_user.id
     result = FriendRequest.send_request(sender_id, receiver_id)
     flash(result, 'info')
-    return redirect(url_for('user_profile', user_id=receiver_id))
+    return redirect(url_for('main.user_profile', user_id=receiver_id))
 
 # Accept friend request
-@app.route('/accept_friend_request/<int:request_id>', methods=['POST'])
+@bp.route('/accept_friend_request/<int:request_id>', methods=['POST'])
 @login_required
 def accept_friend_request(request_id):
     result = current_user.accept_friend_request(request_id)
     flash(result, 'success' if "accepted" in result else 'danger')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 # Decline friend request
-@app.route('/decline_friend_request/<int:request_id>', methods=['POST'])
+@bp.route('/decline_friend_request/<int:request_id>', methods=['POST'])
 @login_required
 def decline_friend_request(request_id):
-    friend_request = FriendRequest.query.get(request_id)
-    if friend_request and friend_request.receiver_id == current_user.id:
-        friend_request.status = 'declined'
-        db.session.commit()
+    if current_user.decline_friend_requests([request_id]):
         flash("Friend request declined.", 'danger')
     else:
         flash("Friend request not found or you are not the recipient.", 'danger')
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
+
+# Accept or decline several friend requests at once (form field request_ids,
+# repeated, and action=accept or decline)
+@bp.route('/respond_friend_requests', methods=['POST'])
+@login_required
+def respond_friend_requests():
+    request_ids = request.form.getlist('request_ids', type=int)
+    action = request.form.get('action')
+    if action == 'accept':
+        count = current_user.accept_friend_requests(request_ids)
+        message = f"Accepted {count} friend requests."
+    elif action == 'decline':
+        count = current_user.decline_friend_requests(request_ids)
+        message = f"Declined {count} friend requests."
+    else:
+        return jsonify({'status': 'error', 'message': "Invalid action."}), 400
+
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'success', 'count': count})
+    flash(message, 'success' if action == 'accept' else 'danger')
+    return redirect(url_for('main.dashboard'))
+
+# Pending friend requests, newest first, paginated with ?cursor=
+@bp.route('/api/friend_requests')
+@read_only
+@login_required
+def friend_requests_api():
+    try:
+        requests, next_cursor = FriendRequest.get_pending_page(
+            current_user.id, request.args.get('cursor'), current_app.config['FRIEND_REQUESTS_PER_PAGE'])
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    return jsonify({'status': 'success',
+                    'requests': [{'id': friend_request.id,
+                                  'sender': {'id': friend_request.sender.id,
+                                             'username': friend_request.sender.username,
+                                             'full_name': friend_request.sender.full_name},
+                                  'timestamp': friend_request.timestamp.isoformat()}
+                                 for friend_request in requests],
+                    'next_cursor': next_cursor})
+
+# Delete the current user's account
+@bp.route('/delete_account', methods=['POST'])
+@login_required
+def delete_account():
+    current_user.delete_account()
+    logout_user()
+    flash("Your account has been deleted.", 'success')
+    return redirect(url_for('main.login'))
 
 # Unfriend a user
-@app.route('/remove_friend/<int:user_id>', methods=['POST'])
+@bp.route('/remove_friend/<int:user_id>', methods=['POST'])
 @login_required
 def remove_friend(user_id):
     result = current_user.remove_friend(user_id)
     flash(result, 'success' if "removed" in result else 'danger')
-    return redirect(url_for('user_profile', user_id=user_id))
+    return redirect(url_for('main.user_profile', user_id=user_id))
     
 # Create a post
-@app.route('/create_post', methods=['GET', 'POST'])
+@bp.route('/create_post', methods=['GET', 'POST'])
 @login_required
 def create_post():
     form = PostForm()
@@ -200,55 +275,32 @@ def create_post():
 
         post = Post(title=title, desc=desc, user_id=current_user.id)
         db.session.add(post)
+        home_timeline.add_post(db.session, post)
         db.session.commit()
         flash("Post created successfully.", 'success')
-        return redirect(url_for('dashboard'))
+        return redirect(url_for('main.dashboard'))
 
     return render_template('create_post.html', form=form)
 
 # Like/unlike a post
-@app.route('/like_post/<int:post_id>', methods=['POST'])
+@bp.route('/like_post/<int:post_id>', methods=['POST'])
 @login_required
 def like_post(post_id):
     if not post_id:
         return jsonify({'status': 'error', 'message': 'Post ID is missing'})
 
     post = Post.query.get(post_id)
-    if not post:
+    if not post or post.user_id is None: # Deleted posts are hidden until purged
         return jsonify({'status': 'error', 'message': 'Post not found'})
 
-    # Check if the current user has already liked the post
-    existing_like = PostLikes.query.filter_by(post_id=post.id, user_id=current_user.id).first()
-
-    if existing_like:
-        # User has already liked the post, so we will unlike it (remove the like)
-        db.session.delete(existing_like)
-        db.session.commit()
-        action = "unliked"
-    else:
-        # User has not liked the post yet, so we will add a like
-        like = PostLikes(post_id=post.id, user_id=current_user.id)
-        db.session.add(like)
-        db.session.commit()
-        action = "liked"
-
-    # Get the new like count
-    new_like_count = PostLikes.query.filter_by(post_id=post.id).count()
-    
-    # Notify the owner of the post (if the post owner is not the current user)
-    if post.user_id != current_user.id and action == "liked":
-        # Create a new notification for the post owner
-        notification = Notification(
-            user_id=post.user_id,
-            message=f"{current_user.username} has liked your post titled {post.title}."
-        )
-        db.session.add(notification)
-        db.session.commit()
+    # Toggle the like; the post's like counter is updated in the same transaction,
+    # or in a later batch when write-behind likes are enabled
+    action, new_like_count = like_buffer.toggle(post.id, current_user.id)
 
     return jsonify({'status': 'success', 'action': action, 'new_like_count': new_like_count})
 
 # Delete a post
-@app.route('/delete_post/<int:post_id>', methods=['POST'])
+@bp.route('/delete_post/<int:post_id>', methods=['POST'])
 @login_required
 def delete_post(post_id):
     post = Post.query.get(post_id)
@@ -258,49 +310,149 @@ def delete_post(post_id):
     else:
         flash("You are not authorized to delete this post.", 'danger')
     
-    return redirect(url_for('dashboard'))
+    return redirect(url_for('main.dashboard'))
 
 # Get notifications
-@app.route('/notifications')
+@bp.route('/notifications')
+@read_only
 @login_required
+@conditional(notifications_stamp)
 def get_notifications():
-    notifications = Notification.get_notifications(current_user.id)
-    return render_template('notifications.html', notifications=notifications)
+    try:
+        notifications, next_cursor = Notification.get_notifications_page(
+            current_user.id, request.args.get('cursor'), current_app.config['NOTIFICATIONS_PER_PAGE'])
+    except ValueError:
+        abort(400)
+    return render_template('notifications.html', notifications=notifications, next_cursor=next_cursor)
+
+# Page of notifications as JSON
+@bp.route('/api/notifications')
+@read_only
+@login_required
+@conditional(notifications_stamp)
+def notifications_api():
+    unread_only = request.args.get('unread_only', '1') != '0'
+    try:
+        notifications, next_cursor = Notification.get_notifications_page(
+            current_user.id, request.args.get('cursor'), current_app.config['NOTIFICATIONS_PER_PAGE'], unread_only)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    return jsonify({'status': 'success',
+                    'unread_count': current_user.unread_count,
+                    'notifications': [{'id': notification.id,
+                                       'message': notification.message,
+                                       'kind': notification.kind,
+                                       'post_id': notification.post_id,
+                                       'is_read': notification.is_read,
+                                       'timestamp': notification.timestamp.isoformat()}
+                                      for notification in notifications],
+                    'next_cursor': next_cursor})
 
 # Mark notification as read
-@app.route('/mark_notification_as_read/<int:notification_id>', methods=['POST'])
+@bp.route('/mark_notification_as_read/<int:notification_id>', methods=['POST'])
 @login_required
 def mark_notification_as_read(notification_id):
-    notification = Notification.query.get(notification_id)
-    if notification:
-        notification.mark_as_read()
+    if Notification.mark_read(current_user.id, [notification_id]):
         flash("Notification marked as read.", 'success')
     else:
         flash("Notification not found.", 'danger')
     
-    return redirect(url_for('get_notifications'))
+    return redirect(url_for('main.get_notifications'))
+
+# Mark all notifications, or the ones given as "ids", as read
+@bp.route('/mark_notifications_as_read', methods=['POST'])
+@login_required
+def mark_notifications_as_read():
+    ids = request.form.getlist('ids', type=int) or None
+    marked = Notification.mark_read(current_user.id, ids)
+    
+    if request.accept_mimetypes.best == 'application/json':
+        return jsonify({'status': 'success', 'marked': marked, 'unread_count': current_user.unread_count})
+    flash(f"{marked} notification{'s' if marked != 1 else ''} marked as read.", 'success')
+    return redirect(url_for('main.get_notifications'))
 
 # View user profile
-@app.route('/user_profile/<int:user_id>', methods=['GET', 'POST'])
+@bp.route('/user_profile/<int:user_id>', methods=['GET', 'POST'])
+@read_only
 @login_required
+@conditional(profile_stamp)
 def user_profile(user_id):
     user_profile = User.query.get(user_id)
-    posts = Post.query.filter_by(user_id=user_id).all()
-    
-    # Sort the posts by most recent
-    posts.sort(key=lambda post: post.timestamp, reverse=True)
+    posts, next_cursor = profile_page(user_id, limit=current_app.config['POSTS_PER_PAGE'])
     
-    post_like_counts = {}
-    post_like_status = {}
-    
-    # Fetch the like count and status for each post
-    for post in posts:
-        post_like_counts[post.id] = PostLikes.query.filter_by(post_id=post.id).count()
-        post_like_status[post.id] = PostLikes.query.filter_by(post_id=post.id, user_id=current_user.id).count()
+    # Fetch the current user's like status for every post at once
+    post_like_status = like_status(posts, current_user.id)
     
     return render_template('user_profile.html', 
                            user_profile=user_profile, 
+                           is_friend=friend_graph.is_friend(current_user.id, user_id), 
+                           mutual_friends=mutual_friend_count(current_user.id, user_id), 
                            posts=posts, 
-                           post_like_counts=post_like_counts,
+                           next_cursor=next_cursor,
                            post_like_status=post_like_status,
-                           current_user=current_user)
\ No newline at end of file
+                           current_user=current_user)
+
+# Render a page of posts as JSON for infinite scroll
+def posts_page_response(posts, next_cursor):
+    post_like_status = like_status(posts, current_user.id)
+    html = render_template('_posts.html',
+                           posts=posts,
+                           post_like_status=post_like_status)
+    return jsonify({'status': 'success',
+                    'html': html,
+                    'post_ids': [post.id for post in posts],
+                    'next_cursor': next_cursor,
+                    'next_url': url_for(request.endpoint, cursor=next_cursor, **request.view_args) if next_cursor else None})
+
+# Next page of the dashboard feed
+@bp.route('/api/feed')
+@read_only
+@login_required
+@conditional(dashboard_stamp)
+def feed_api():
+    try:
+        posts, next_cursor = feed_page(current_user.id, request.args.get('cursor'), current_app.config['POSTS_PER_PAGE'])
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return posts_page_response(posts, next_cursor)
+
+# Next page of a user's profile posts
+@bp.route('/api/user_profile/<int:user_id>/posts')
+@read_only
+@login_required
+@conditional(profile_stamp)
+def profile_posts_api(user_id):
+    try:
+        posts, next_cursor = profile_page(user_id, request.args.get('cursor'), current_app.config['POSTS_PER_PAGE'])
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return posts_page_response(posts, next_cursor)
+
+# Server-Sent Events stream of the current user's notifications and the
+# like counts of the posts given as ?posts=1,2,3
+@bp.route('/stream')
+@login_required
+def stream():
+    post_ids = {int(post_id) for post_id in request.args.get('posts', '').split(',') if post_id.isdigit()}
+    channels = [user_channel(current_user.id)] + [post_channel(post_id) for post_id in sorted(post_ids)[:current_app.config['STREAM_MAX_POSTS']]]
+    heartbeat = current_app.config['STREAM_HEARTBEAT']
+    subscription = hub.subscribe(channels)
+    
+    # Give the database connection back before holding the response open
+    db.session.close()
+    
+    def events():
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                message = subscription.get(timeout=heartbeat)
+                if message is None:
+                    yield ": keep-alive\n\n"
+                else:
+                    yield f"event: {message['event']}\ndata: {json.dumps(message['data'])}\n\n"
+        finally:
+            subscription.close()
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
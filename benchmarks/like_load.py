@@ -0,0 +1,111 @@
+# Load benchmark for /like_post/<id>: per-request commits vs write-behind likes.
+#
+#   python benchmarks/like_load.py --users 200 --threads 16 --toggles 50
+#
+# Every simulated user logs in with its own test client and repeatedly toggles
+# a like on the same hot post, so all writes contend for one post_table row.
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='headnovel-bench-'), 'bench.db')
+config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DB_PATH
+config.WTF_CSRF_ENABLED = False
+
+from app import create_app, db
+from app.likes import like_buffer
+from app.models import User, Post
+from werkzeug.security import generate_password_hash
+
+app = create_app()
+
+
+def seed(users):
+    db.drop_all()
+    db.create_all()
+    password = generate_password_hash('benchmark')
+    db.session.execute(db.insert(User), [
+        {'username': f'bench{i}', 'password': password, 'full_name': f'Bench User {i}'}
+        for i in range(users)
+    ])
+    db.session.add(Post(title='hot post', desc='Everybody likes this post', user_id=1))
+    db.session.commit()
+    return db.session.query(Post.id).scalar()
+
+
+def run(mode, args):
+    app.config['LIKE_WRITE_BEHIND'] = mode == 'write-behind'
+    like_buffer.init_app(app)
+
+    with app.app_context():
+        post_id = seed(args.users)
+
+    clients = []
+    for i in range(args.users):
+        client = app.test_client()
+        client.post('/login', data={'username': f'bench{i}', 'password': 'benchmark'})
+        clients.append(client)
+
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def worker(worker_clients):
+        local = []
+        for _ in range(args.toggles):
+            for client in worker_clients:
+                start = time.perf_counter()
+                response = client.post(f'/like_post/{post_id}')
+                local.append(time.perf_counter() - start)
+                assert response.get_json()['status'] == 'success'
+        with latencies_lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(clients[i::args.threads],)) for i in range(args.threads)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    with app.app_context():
+        like_buffer.flush()
+        like_count = db.session.get(Post, post_id).like_count
+
+    # Each user toggles an even or odd number of times, so the final count is known
+    expected = args.users if args.toggles % 2 else 0
+    latencies.sort()
+    return {
+        'mode': mode,
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'p95_ms': round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 2),
+        'like_count': like_count,
+        'consistent': like_count == expected,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--toggles', type=int, default=25, help='like toggles per user')
+    args = parser.parse_args()
+
+    for mode in ('per-request', 'write-behind'):
+        result = run(mode, args)
+        print(' '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+# Check and measure read/write routing against a primary and a replica.
+#
+#   python benchmarks/read_replicas.py --users 2000 --requests 500
+#
+# Seeds a primary SQLite file with benchmarks/social_graph.py and copies it
+# to a second file standing in for the replica. Then checks that:
+#   - views marked @read_only read from the replica (apart from the
+#     per-process friend and suggestion caches, which load from the primary),
+#     other views and writes go to the primary
+#   - a client that just wrote reads its own write from the primary, while
+#     other clients still see the (stale) replica
+#   - after READ_YOUR_WRITES_SECONDS the writer is back on the replica
+#   - the replica refuses writes
+# and reports queries per bind and latency for --requests GETs of each
+# read-only route. Exits non-zero if a check fails.
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+DIRECTORY = tempfile.mkdtemp(prefix='headnovel-bench-')
+PRIMARY_PATH = os.path.join(DIRECTORY, 'primary.db')
+REPLICA_PATH = os.path.join(DIRECTORY, 'replica.db')
+config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + PRIMARY_PATH
+config.SQLALCHEMY_BINDS = {'replica': {'url': 'sqlite:///' + REPLICA_PATH, 'pool_size': 5, 'max_overflow': 0}}
+config.READ_REPLICAS = ['replica']
+config.READ_YOUR_WRITES_SECONDS = 1
+config.WTF_CSRF_ENABLED = False
+config.JOB_QUEUE_ENABLED = False
+
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+from app import create_app, db, suggestions
+from app.friend_graph import friend_graph
+from social_graph import PASSWORD, seed
+
+app = create_app()
+
+READ_ROUTES = [
+    ('dashboard', '/dashboard'),
+    ('user_profile', '/user_profile/{user}'),
+    ('search_users', '/search_users?query=user{prefix}'),
+    ('get_notifications', '/notifications'),
+    ('feed_api', '/api/feed'),
+]
+
+# Statements executed per bind since the last reset
+queries = {}
+
+
+def count_queries():
+    with app.app_context():
+        for key, engine in db.engines.items():
+            name = key or 'primary'
+
+            @event.listens_for(engine, 'before_cursor_execute')
+            def counted(conn, cursor, statement, parameters, context, executemany, name=name):
+                queries[name] = queries.get(name, 0) + 1
+
+
+# Copy the primary into the replica, as replication would
+def replicate():
+    with sqlite3.connect(PRIMARY_PATH) as source, sqlite3.connect(REPLICA_PATH) as target:
+        source.backup(target)
+    source.close()
+    target.close()
+
+
+def login(user_id):
+    client = app.test_client()
+    response = client.post('/login', data={'username': f'user{user_id}', 'password': PASSWORD})
+    assert response.status_code == 302, f"login failed for user{user_id}"
+    return client
+
+
+def routed(client, method, path, **kwargs):
+    queries.clear()
+    response = client.open(path, method=method, **kwargs)
+    assert response.status_code < 400, f"{method} {path}: {response.status_code}"
+    return response, dict(queries)
+
+
+def check(name, condition, failures):
+    print(f"{'ok' if condition else 'FAIL'}  {name}")
+    if not condition:
+        failures.append(name)
+
+
+def run_checks(users):
+    failures = []
+    writer, reader = login(1), login(2)
+
+    friend_graph.clear()
+    suggestions.cache.invalidate(2)
+    _, used = routed(reader, 'GET', '/dashboard')
+    check("read-only view reads from the replica", used.get('replica'), failures)
+    _, used = routed(reader, 'GET', '/dashboard')
+    check("cached friend sets and suggestions are not re-read", not used.get('primary'), failures)
+
+    _, used = routed(reader, 'GET', '/edit')
+    check("other views read from the primary", used.get('primary') and not used.get('replica'), failures)
+
+    title = f'Replica check {time.time():.0f}'
+    _, used = routed(writer, 'POST', '/create_post', data={'title': title, 'desc': 'Written to the primary'})
+    check("writes go to the primary", used.get('primary') and not used.get('replica'), failures)
+
+    response, used = routed(writer, 'GET', '/user_profile/1')
+    check("writer reads its own write from the primary",
+          title.encode() in response.data and not used.get('replica'), failures)
+
+    response, used = routed(reader, 'GET', '/user_profile/1')
+    check("other clients read the lagging replica",
+          title.encode() not in response.data and used.get('replica'), failures)
+
+    time.sleep(config.READ_YOUR_WRITES_SECONDS)
+    _, used = routed(writer, 'GET', '/user_profile/1')
+    check("writer returns to the replica after READ_YOUR_WRITES_SECONDS", used.get('replica'), failures)
+
+    replicate()
+    response, _ = routed(reader, 'GET', '/user_profile/1')
+    check("replicated write is visible on the replica", title.encode() in response.data, failures)
+
+    with app.app_context():
+        try:
+            with db.engines['replica'].begin() as connection:
+                connection.execute(text("UPDATE user_table SET bio = 'diverged' WHERE id = 1"))
+            refused = False
+        except OperationalError:
+            refused = True
+    check("replica refuses writes", refused, failures)
+    return failures
+
+
+def run_load(users, requests, seed_value):
+    rng = random.Random(seed_value)
+    clients = [login(user_id) for user_id in rng.sample(range(3, users + 1), min(20, users - 2))]
+    report = {}
+    for name, path in READ_ROUTES:
+        timings, per_bind = [], {}
+        for _ in range(requests):
+            start = time.perf_counter()
+            _, used = routed(rng.choice(clients), 'GET', path.format(user=rng.randint(1, users), prefix=rng.randint(1, 99)))
+            timings.append(time.perf_counter() - start)
+            for bind, count in used.items():
+                per_bind[bind] = per_bind.get(bind, 0) + count
+        timings.sort()
+        report[name] = {
+            'requests': requests,
+            'p50_ms': round(timings[len(timings) // 2] * 1000, 2),
+            'p95_ms': round(timings[min(int(len(timings) * 0.95), len(timings) - 1)] * 1000, 2),
+            'queries_per_request': {bind: round(count / requests, 2) for bind, count in sorted(per_bind.items())},
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=2_000)
+    parser.add_argument('--degree', type=int, default=20)
+    parser.add_argument('--posts', type=int, default=5)
+    parser.add_argument('--requests', type=int, default=200, help="GETs per read-only route")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    with app.app_context():
+        rows = seed(db, args.users, args.degree, posts=args.posts, seed=args.seed)
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+    replicate()
+    count_queries()
+
+    failures = run_checks(args.users)
+    print(json.dumps({'primary': PRIMARY_PATH, 'replica': REPLICA_PATH, 'rows': rows,
+                      'routes': run_load(args.users, args.requests, args.seed)}, indent=2))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
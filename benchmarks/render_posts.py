@@ -0,0 +1,80 @@
+# Benchmark rendering a timeline page with and without the post fragment cache.
+#
+#   python benchmarks/render_posts.py --posts 50 --renders 500
+#
+# Renders _posts.html for one page of posts inside a logged-in request, so
+# the per-viewer footer is included, and reports per-page latency for the
+# uncached and the warm cached case.
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='headnovel-bench-'), 'bench.db')
+config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DB_PATH
+
+from flask import render_template
+from flask_login import login_user
+from app import create_app, db
+from app.feed import profile_page, like_status
+from app.fragments import fragment_cache
+from app.models import User, Post
+
+app = create_app()
+
+
+def seed(posts):
+    db.create_all()
+    db.session.execute(db.insert(User), [{'id': 1, 'username': 'bench', 'password': 'x', 'full_name': 'Bench User'}])
+    db.session.execute(db.insert(Post), [
+        {'user_id': 1, 'title': f'post {i}', 'desc': f'Post number {i}. ' * 20}
+        for i in range(posts)
+    ])
+    db.session.commit()
+
+
+def timed(renders, fn):
+    timings = []
+    for _ in range(renders):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {'p50_ms': round(statistics.median(timings) * 1000, 3),
+            'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000, 3),
+            'mean_ms': round(statistics.fmean(timings) * 1000, 3)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--posts', type=int, default=50)
+    parser.add_argument('--renders', type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        seed(args.posts)
+
+    with app.test_request_context('/dashboard'):
+        login_user(db.session.get(User, 1))
+        posts, _ = profile_page(1, limit=args.posts)
+        status = like_status(posts, 1)
+
+        def render():
+            return render_template('_posts.html', posts=posts, post_like_status=status)
+
+        for label, enabled in (('uncached', False), ('cached', True)):
+            fragment_cache.enabled = enabled
+            fragment_cache.backend.clear()
+            render() # Warm up Jinja's template cache (and the fragment cache)
+            result = timed(args.renders, render)
+            print(f"mode={label} posts={len(posts)} " + ' '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+# Load benchmark for the main routes on a synthetic social graph.
+#
+#   python benchmarks/routes.py --users 10000 --clients 50 --concurrency 8 --duration 30 --output bench.json
+#
+# Seeds a database with benchmarks/social_graph.py, logs in --clients users
+# and has --concurrency threads send a weighted mix of requests to
+# /dashboard, /user_profile/<id>, /like_post/<id>, /search_users and
+# /notifications for --duration seconds, through the Flask test client or
+# (with --wsgi) a local WSGI server over HTTP. Prints (or writes to --output)
+# a JSON report with p50/p95/p99 latency, throughput and SQL queries per
+# request for each route, plus the commit it ran against, so runs can be
+# compared across commits.
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='headnovel-bench-'), 'bench.db')
+config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DB_PATH
+config.WTF_CSRF_ENABLED = False
+config.METRICS_ENABLED = True
+
+from app import create_app, db
+from app.metrics import metrics
+from social_graph import PASSWORD, seed
+
+app = create_app()
+
+# (name, weight, method, path); {user} is a random user id, {post} a random post id
+ROUTES = [
+    ('dashboard', 40, 'GET', '/dashboard'),
+    ('user_profile', 20, 'GET', '/user_profile/{user}'),
+    ('like_post', 20, 'POST', '/like_post/{post}'),
+    ('search_users', 10, 'GET', '/search_users?query=user{prefix}'),
+    ('get_notifications', 10, 'GET', '/notifications'),
+]
+
+
+class TestClient:
+    def __init__(self):
+        self.client = app.test_client()
+
+    def request(self, method, path, data=None):
+        return self.client.open(path, method=method, data=data).status_code
+
+
+class HTTPClient:
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+
+    def request(self, method, path, data=None):
+        body = urllib.parse.urlencode(data).encode() if data else (b'' if method == 'POST' else None)
+        try:
+            with self.opener.open(urllib.request.Request(self.base_url + path, data=body, method=method)) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def start_server():
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_port}'
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    with app.app_context():
+        started = time.perf_counter()
+        rows = seed(db, args.users, args.degree, args.distribution, posts=args.posts, seed=args.seed)
+        seed_seconds = time.perf_counter() - started
+
+    server = None
+    if args.wsgi:
+        server, base_url = start_server()
+        make_client = lambda: HTTPClient(base_url)
+    else:
+        make_client = TestClient
+
+    rng = random.Random(args.seed)
+    clients = []
+    for user_id in rng.sample(range(1, args.users + 1), min(args.clients, args.users)):
+        client = make_client()
+        client.request('POST', '/login', {'username': f'user{user_id}', 'password': PASSWORD})
+        clients.append(client)
+
+    names, weights = [route[0] for route in ROUTES], [route[1] for route in ROUTES]
+    routes = {route[0]: route for route in ROUTES}
+    results = {name: [] for name in names}
+    errors = dict.fromkeys(names, 0)
+    lock = threading.Lock()
+    metrics.reset()
+    deadline = time.perf_counter() + args.duration
+
+    def worker(index):
+        local_rng = random.Random(args.seed + index)
+        local = {name: [] for name in names}
+        local_errors = dict.fromkeys(names, 0)
+        while time.perf_counter() < deadline:
+            name = local_rng.choices(names, weights)[0]
+            _, _, method, path = routes[name]
+            path = path.format(user=local_rng.randint(1, args.users), post=local_rng.randint(1, rows['post_table']),
+                               prefix=local_rng.randint(1, 99))
+            client = local_rng.choice(clients)
+            start = time.perf_counter()
+            status = client.request(method, path)
+            local[name].append(time.perf_counter() - start)
+            if status >= 400:
+                local_errors[name] += 1
+        with lock:
+            for name in names:
+                results[name].extend(local[name])
+                errors[name] += local_errors[name]
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    if server is not None:
+        server.shutdown()
+
+    endpoint_stats = metrics.snapshot()
+    report = {
+        'commit': git_commit(),
+        'config': vars(args),
+        'seed': {'rows': rows, 'seconds': round(seed_seconds, 2)},
+        'elapsed_seconds': round(elapsed, 2),
+        'routes': {},
+    }
+    for name in names:
+        timings = sorted(results[name])
+        stats = endpoint_stats.get(f'main.{name}', {})
+        report['routes'][name] = {
+            'requests': len(timings),
+            'errors': errors[name],
+            'throughput_rps': round(len(timings) / elapsed, 1),
+            'p50_ms': round(percentile(timings, 0.50) * 1000, 2) if timings else None,
+            'p95_ms': round(percentile(timings, 0.95) * 1000, 2) if timings else None,
+            'p99_ms': round(percentile(timings, 0.99) * 1000, 2) if timings else None,
+            'queries_per_request': round(stats['queries'] / stats['requests'], 2) if stats.get('requests') else None,
+        }
+    total = sum(len(timings) for timings in results.values())
+    report['total'] = {'requests': total, 'errors': sum(errors.values()), 'throughput_rps': round(total / elapsed, 1)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--degree', type=int, default=20)
+    parser.add_argument('--distribution', choices=('powerlaw', 'uniform'), default='powerlaw')
+    parser.add_argument('--posts', type=int, default=5)
+    parser.add_argument('--clients', type=int, default=50, help="logged-in users sending requests")
+    parser.add_argument('--concurrency', type=int, default=8, help="threads sending requests")
+    parser.add_argument('--duration', type=float, default=30, help="seconds to run")
+    parser.add_argument('--wsgi', action='store_true', help="go through a local WSGI server instead of the test client")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', help="write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = json.dumps(run(args), indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report + '\n')
+    print(report)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+# Benchmark user search: the old leading-wildcard ILIKE scan vs the FTS5 index.
+#
+#   python benchmarks/search_users.py --users 1000000
+#
+# Users are bulk-loaded with the search triggers dropped and the index is
+# rebuilt once afterwards, which is also the fastest way to backfill it.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='headnovel-bench-'), 'bench.db')
+config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DB_PATH
+
+from app import create_app, db, search
+from app.models import User
+
+app = create_app()
+
+SYLLABLES = ['al', 'be', 'cor', 'da', 'el', 'fi', 'gor', 'ha', 'is', 'jo', 'ka', 'li',
+             'mo', 'na', 'or', 'pe', 'qui', 'ra', 'so', 'ti', 'ul', 've', 'wil', 'xa', 'yo', 'ze']
+WORDS = ['music', 'travel', 'coffee', 'python', 'hiking', 'books', 'games', 'art', 'food', 'films']
+
+
+def name(rng, parts):
+    return ''.join(rng.choice(SYLLABLES) for _ in range(parts))
+
+
+def seed(users, batch=50_000):
+    rng = random.Random(42)
+    db.create_all()
+    with db.engine.begin() as connection:
+        for statement in search.DROP_DDL:
+            connection.exec_driver_sql(statement)
+        for start in range(0, users, batch):
+            connection.execute(db.insert(User), [
+                {'username': f'{name(rng, 3)}{i}',
+                 'password': 'x',
+                 'full_name': f'{name(rng, 2).title()} {name(rng, 3).title()}',
+                 'bio': ' '.join(rng.sample(WORDS, 3))}
+                for i in range(start, min(start + batch, users))
+            ])
+        search.create_index(connection)
+        search.rebuild_index(connection)
+
+
+def timed(fn, queries):
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {'p50_ms': round(statistics.median(timings) * 1000, 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1] * 1000, 2)}
+
+
+def ilike_scan(query):
+    return User.query.filter(
+        (User.username.ilike(f"%{query}%")) | (User.full_name.ilike(f"%{query}%"))
+    ).all()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    # Keystroke-style prefixes: 2 to 5 characters of a generated name
+    queries = [name(rng, 3)[:rng.randint(2, 5)] for _ in range(args.queries)]
+
+    with app.app_context():
+        start = time.perf_counter()
+        seed(args.users)
+        print(f"seeded users={args.users} seconds={time.perf_counter() - start:.1f}")
+
+        for label, fn in (('ilike-scan', ilike_scan),
+                          ('fts5-prefix', lambda query: search.search_users(query, limit=20))):
+            result = timed(fn, queries)
+            print(f"mode={label} " + ' '.join(f'{key}={value}' for key, value in result.items()))
+
+
+if __name__ == '__main__':
+    main()
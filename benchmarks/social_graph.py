@@ -0,0 +1,185 @@
+# Synthetic social graph generator for benchmarks.
+#
+#   python benchmarks/social_graph.py --users 100000 --degree 20 --posts 5 --likes 3
+#
+# Seeds users, friendships, friend requests, posts, likes and notifications
+# into the configured database with executemany on the raw driver connection,
+# with secondary indexes and the search triggers dropped until the end, so a
+# million rows load in seconds. Friend degrees follow a power law (most
+# users have a few friends, a few users have thousands) or are uniform.
+# Denormalized counters (friend_count, post_count, like_count, unread_count)
+# are written consistent with the generated rows. Every user's password is
+# "benchmark" and usernames are user<id>.
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+PASSWORD = 'benchmark'
+BATCH = 50_000
+TABLES = {'user_table', 'friends', 'friend_request_table', 'post_table', 'post_likes', 'notification_table'}
+
+
+def friend_degrees(rng, users, degree, distribution, max_degree):
+    if distribution == 'uniform':
+        return [rng.randint(0, 2 * degree) for _ in range(users)]
+    # Pareto with shape 2 has mean 2 * scale; scale it to the requested mean
+    return [min(int(rng.paretovariate(2) * degree / 2), max_degree) for _ in range(users)]
+
+
+def generate_edges(rng, users, degrees):
+    # Configuration model: each user gets as many stubs as its degree and
+    # stubs are paired at random; self-loops and duplicates are dropped
+    stubs = [user_id for user_id, degree in enumerate(degrees, start=1) for _ in range(degree)]
+    rng.shuffle(stubs)
+    edges = set()
+    for a, b in zip(stubs[::2], stubs[1::2]):
+        if a != b:
+            edges.add((min(a, b), max(a, b)))
+    return edges
+
+
+def timestamp(rng, start):
+    return (start + timedelta(seconds=int(rng.random() * 180 * 86400))).isoformat(' ')
+
+
+def insert(connection, statement, rows):
+    rows = iter(rows)
+    total = 0
+    while True:
+        batch = [row for _, row in zip(range(BATCH), rows)]
+        if not batch:
+            return total
+        connection.exec_driver_sql(statement, batch)
+        total += len(batch)
+
+
+# Seed the database; returns the number of rows written per table
+def seed(db, users=10_000, degree=20, distribution='powerlaw', max_degree=5_000,
+         posts=5, likes=3, notifications=10, pending_requests=2, seed=42):
+    from werkzeug.security import generate_password_hash
+    from sqlalchemy.exc import OperationalError
+    from app import search
+    from app.passwords import hasher
+
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    password = generate_password_hash(PASSWORD, hasher.method)
+
+    degrees = friend_degrees(rng, users, degree, distribution, min(max_degree, users - 1))
+    edges = generate_edges(rng, users, degrees)
+    friend_counts = [0] * (users + 1)
+    for a, b in edges:
+        friend_counts[a] += 1
+        friend_counts[b] += 1
+
+    post_counts = [0] * (users + 1)
+    post_rows = []
+    for user_id in range(1, users + 1):
+        for _ in range(rng.randint(0, 2 * posts)):
+            post_counts[user_id] += 1
+            post_id = len(post_rows) + 1
+            post_rows.append([post_id, user_id, f'post {post_id}', f'Synthetic post {post_id} by user{user_id}.', 0,
+                              timestamp(rng, start)])
+
+    like_rows = set()
+    for post in post_rows:
+        for _ in range(min(int(rng.random() * (2 * likes + 1)), users)):
+            like_rows.add((post[0], 1 + int(rng.random() * users)))
+    for post_id, _ in like_rows:
+        post_rows[post_id - 1][4] += 1
+
+    unread_counts = [0] * (users + 1)
+    notification_rows = []
+    for user_id in range(1, users + 1):
+        for _ in range(rng.randint(0, 2 * notifications)):
+            is_read = rng.random() < 0.7
+            unread_counts[user_id] += not is_read
+            notification_rows.append((user_id, f"user{1 + int(rng.random() * users)} sent you a friend request.",
+                                      timestamp(rng, start), is_read, 'friend_request'))
+
+    request_rows = []
+    for user_id in range(1, users + 1):
+        for _ in range(rng.randint(0, 2 * pending_requests)):
+            sender_id = rng.randint(1, users)
+            if sender_id != user_id:
+                request_rows.append((sender_id, user_id, 'pending', start.isoformat(' ')))
+
+    db.create_all()
+    tables = [table for table in db.metadata.sorted_tables if table.name in TABLES]
+    counts = {}
+    with db.engine.begin() as connection:
+        # Build indexes once at the end instead of updating them row by row
+        for table in tables:
+            for index in table.indexes:
+                index.drop(connection)
+        for statement in search.DROP_DDL:
+            connection.exec_driver_sql(statement)
+
+        counts['user_table'] = insert(connection,
+            "INSERT INTO user_table (id, username, password, full_name, bio, friend_count, post_count, unread_count) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            ((i, f'user{i}', password, f'User {i}', f'Synthetic user number {i}',
+              friend_counts[i], post_counts[i], unread_counts[i]) for i in range(1, users + 1)))
+        # Friendships are stored in both directions
+        counts['friends'] = insert(connection, "INSERT INTO friends (user_id, friend_id) VALUES (?, ?)",
+                                   (pair for a, b in edges for pair in ((a, b), (b, a))))
+        counts['friend_request_table'] = insert(connection,
+            "INSERT INTO friend_request_table (sender_id, receiver_id, status, timestamp) VALUES (?, ?, ?, ?)",
+            request_rows)
+        counts['post_table'] = insert(connection,
+            "INSERT INTO post_table (id, user_id, title, \"desc\", like_count, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            map(tuple, post_rows))
+        counts['post_likes'] = insert(connection,
+            "INSERT INTO post_likes (post_id, user_id, is_liked) VALUES (?, ?, 1)", like_rows)
+        counts['notification_table'] = insert(connection,
+            "INSERT INTO notification_table (user_id, message, timestamp, is_read, kind, actor_count) "
+            "VALUES (?, ?, ?, ?, ?, 1)", notification_rows)
+
+        for table in tables:
+            for index in table.indexes:
+                index.create(connection)
+        try:
+            search.create_index(connection)
+            search.rebuild_index(connection)
+        except OperationalError:
+            pass # SQLite built without FTS5
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', help="SQLite file to seed (default: a new temporary file)")
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--degree', type=int, default=20, help="mean friends per user")
+    parser.add_argument('--distribution', choices=('powerlaw', 'uniform'), default='powerlaw')
+    parser.add_argument('--max-degree', type=int, default=5_000)
+    parser.add_argument('--posts', type=int, default=5, help="mean posts per user")
+    parser.add_argument('--likes', type=int, default=3, help="mean likes per post")
+    parser.add_argument('--notifications', type=int, default=10, help="mean notifications per user")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    import config
+    path = args.database or os.path.join(tempfile.mkdtemp(prefix='headnovel-bench-'), 'bench.db')
+    config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(path)
+
+    from app import create_app, db
+    app = create_app()
+    with app.app_context():
+        started = time.perf_counter()
+        counts = seed(db, args.users, args.degree, args.distribution, args.max_degree,
+                      args.posts, args.likes, args.notifications, seed=args.seed)
+        seconds = time.perf_counter() - started
+    print(json.dumps({'database': path, 'rows': counts, 'total_rows': sum(counts.values()),
+                      'seconds': round(seconds, 2)}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+# Measure app startup time and memory with and without optional subsystems.
+#
+#   python benchmarks/startup.py --runs 10
+#
+# Each run is a fresh interpreter that imports the app package and calls
+# create_app(), as a gunicorn worker or CLI invocation would. Reports the
+# median import + create_app time, peak RSS and number of loaded modules for
+# the full app and for a public-only worker (no admin, migrations or i18n).
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+from app import create_app
+app = create_app(**json.loads(sys.argv[1]))
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  'modules': len(sys.modules)}))
+"""
+
+VARIANTS = {
+    'full': {},
+    'public': {'ADMIN_ENABLED': False, 'MIGRATIONS_ENABLED': False, 'I18N_ENABLED': False},
+}
+
+
+def measure(settings, runs):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', PROBE, json.dumps(settings)], cwd=ROOT)
+        samples.append(json.loads(output.decode().strip().splitlines()[-1]))
+    return {'startup_ms': round(statistics.median(s['seconds'] for s in samples) * 1000, 1),
+            'peak_rss_mb': round(statistics.median(s['rss_kb'] for s in samples) / 1024, 1),
+            'modules': samples[-1]['modules']}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+    print(json.dumps({name: measure(settings, args.runs) for name, settings in VARIANTS.items()}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+# Benchmark "people you may know" on a synthetic friend graph.
+#
+#   python benchmarks/suggestions.py --users 20000 --degree 50 --hub-degree 5000
+#
+# Ordinary users get about --degree friends; one hub user is friends with
+# --hub-degree others. Reports cold (uncached) latency for both, then the
+# cached latency, so the budget and friend sampling can be tuned.
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix='headnovel-bench-'), 'bench.db')
+config.SQLALCHEMY_DATABASE_URI = 'sqlite:///' + DB_PATH
+
+from app import create_app, db, suggestions
+from app.models import User, friend_association
+from app.friend_graph import friend_graph
+
+app = create_app()
+
+HUB_ID = 1
+
+
+def seed(users, degree, hub_degree, batch=50_000):
+    rng = random.Random(42)
+    db.create_all()
+    with db.engine.begin() as connection:
+        connection.execute(db.insert(User), [
+            {'id': i, 'username': f'user{i}', 'password': 'x', 'full_name': f'User {i}'}
+            for i in range(1, users + 1)
+        ])
+        edges = set()
+        for other in rng.sample(range(2, users + 1), hub_degree):
+            edges.add((HUB_ID, other))
+        for user_id in range(2, users + 1):
+            for _ in range(degree // 2):
+                other = rng.randint(2, users)
+                if other != user_id:
+                    edges.add((min(user_id, other), max(user_id, other)))
+        # Friendships are stored in both directions
+        rows = [{'user_id': a, 'friend_id': b} for a, b in edges] + \
+               [{'user_id': b, 'friend_id': a} for a, b in edges]
+        for start in range(0, len(rows), batch):
+            connection.execute(friend_association.insert(), rows[start:start + batch])
+    return len(edges)
+
+
+def timed(fn, user_ids):
+    timings = []
+    for user_id in user_ids:
+        start = time.perf_counter()
+        fn(user_id)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {'p50_ms': round(statistics.median(timings) * 1000, 2),
+            'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)] * 1000, 2),
+            'max_ms': round(timings[-1] * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20_000)
+    parser.add_argument('--degree', type=int, default=50)
+    parser.add_argument('--hub-degree', type=int, default=5_000)
+    parser.add_argument('--samples', type=int, default=100)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    user_ids = rng.sample(range(2, args.users + 1), args.samples)
+
+    with app.app_context():
+        start = time.perf_counter()
+        edges = seed(args.users, args.degree, args.hub_degree)
+        print(f"seeded users={args.users} friendships={edges} seconds={time.perf_counter() - start:.1f}")
+
+        def cold(user_id):
+            suggestions.cache.invalidate(user_id)
+            friend_graph.invalidate(user_id)
+            return suggestions.suggest_friends(user_id, app.config['SUGGESTIONS_LIMIT'])
+
+        def warm(user_id):
+            return suggestions.suggest_friends(user_id, app.config['SUGGESTIONS_LIMIT'])
+
+        for label, fn, ids in (('cold', cold, user_ids),
+                               ('hub-cold', cold, [HUB_ID] * 10),
+                               ('warm', warm, user_ids),
+                               ('hub-warm', warm, [HUB_ID] * 10)):
+            result = timed(fn, ids)
+            print(f"mode={label} " + ' '.join(f'{key}={value}' for key, value in result.items()))
+        print(f"hub suggestions={suggestions.mutual_friend_candidates(HUB_ID, 5)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,162 @@
 import os
 
 basedir = os.path.abspath(os.path.dirname(__file__))
-SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(basedir, 'app.db')
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'app.db'))
 SQLALCHEMY_TRACK_MODIFICATIONS = True
 
+# Applied once to every new SQLite connection (see app/database.py). WAL lets
+# readers proceed while a write is in progress; busy_timeout is in
+# milliseconds, a negative cache_size is in KiB and mmap_size is in bytes.
+SQLITE_PRAGMAS = {
+    'foreign_keys': 'ON',
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,
+    'mmap_size': 268435456,
+}
+
+# Connection pool per worker process: size it to the worker's thread count so
+# concurrent requests each get a connection instead of queueing for one. The
+# sizing options are dropped for in-memory SQLite (DATABASE_URL=sqlite://),
+# which runs on a single static connection
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': 10,
+    'max_overflow': 10,
+    'pool_timeout': 10,
+    'pool_recycle': 3600,
+}
+
+# Read replicas: binds in SQLALCHEMY_BINDS (each with its own pool options,
+# SQLALCHEMY_ENGINE_OPTIONS only applies to the primary) that views marked
+# @read_only query for GET requests. A client that has just written reads
+# from the primary for READ_YOUR_WRITES_SECONDS, which should cover the
+# replicas' lag. Keeping them in sync (e.g. Litestream or LiteFS for SQLite)
+# is up to the deployment.
+SQLALCHEMY_BINDS = {}
+if os.environ.get('DATABASE_REPLICA_URL'):
+    SQLALCHEMY_BINDS['replica'] = {
+        'url': os.environ['DATABASE_REPLICA_URL'],
+        'pool_size': 20,
+        'max_overflow': 10,
+        'pool_timeout': 10,
+        'pool_recycle': 3600,
+    }
+READ_REPLICAS = list(SQLALCHEMY_BINDS)
+READ_YOUR_WRITES_SECONDS = 5
+
 WTF_CSRF_ENABLED = True
-SECRET_KEY = 'a-very-secret-secret'
\ No newline at end of file
+SECRET_KEY = 'a-very-secret-secret'
+
+# Optional subsystems, only imported when enabled. Workers that serve just the
+# public pages can start without them, e.g.
+#   gunicorn "app:create_app(ADMIN_ENABLED=False, MIGRATIONS_ENABLED=False, I18N_ENABLED=False)"
+ADMIN_ENABLED = True
+MIGRATIONS_ENABLED = True
+I18N_ENABLED = True
+
+# Seconds the admin panel reuses a table's row count before counting again
+ADMIN_COUNT_CACHE_TTL = 300
+
+# Password hashing runs on PASSWORD_HASH_WORKERS threads per process with at
+# most PASSWORD_HASH_QUEUE waiting; further logins are turned away (503).
+# Stored hashes not made with PASSWORD_HASH_METHOD are rehashed on login.
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+PASSWORD_HASH_WORKERS = 2
+PASSWORD_HASH_QUEUE = 16
+PASSWORD_HASH_TIMEOUT = 10
+
+# Per-request SQL and render timings, summed per endpoint and served at
+# /metrics in Prometheus text format. METRICS_HEADER adds a Server-Timing
+# header to every response; statements repeated METRICS_N_PLUS_ONE_THRESHOLD
+# times within one request are logged as likely N+1 queries.
+METRICS_ENABLED = True
+METRICS_HEADER = False
+METRICS_N_PLUS_ONE_THRESHOLD = 5
+METRICS_SLOWEST_STATEMENTS = 5
+
+# Number of posts per timeline page (dashboard, profile and infinite scroll)
+POSTS_PER_PAGE = 20
+
+# Fan-out-on-write home timelines: copy each new post into its author's
+# friends' timelines so the dashboard reads one indexed range. Authors with
+# more friends than the limit are merged into readers' feeds at read time.
+# Run `flask backfill-home-timeline` after enabling.
+HOME_TIMELINE = False
+HOME_TIMELINE_FANOUT_LIMIT = 1000
+
+# Cache of rendered post markup (title, author and text; like counts and
+# buttons are rendered per viewer). The LRU backend keeps FRAGMENT_CACHE_SIZE
+# posts per process; any class with get/set/delete can replace it.
+FRAGMENT_CACHE = True
+FRAGMENT_CACHE_BACKEND = 'app.fragments.LRUBackend'
+FRAGMENT_CACHE_SIZE = 10000
+
+# Write-behind likes: buffer like/unlike toggles in process and write them in
+# batches every LIKE_FLUSH_INTERVAL seconds or once LIKE_FLUSH_SIZE are pending
+LIKE_WRITE_BEHIND = False
+LIKE_FLUSH_INTERVAL = 0.5
+LIKE_FLUSH_SIZE = 500
+
+# Number of notifications per page (notifications page and JSON API)
+NOTIFICATIONS_PER_PAGE = 20
+
+# Pending friend requests shown on the dashboard and per page of /api/friend_requests
+FRIEND_REQUESTS_PER_PAGE = 20
+
+# Deleting a post or account hides it at once; a background job then removes
+# its likes, notifications, friendships and posts DELETION_BATCH rows per
+# transaction, pausing DELETION_PAUSE seconds between batches
+DELETION_BATCH = 500
+DELETION_PAUSE = 0.05
+
+# Background jobs (notifications, timeline fan-out, deletions) are stored in
+# the job_queue table and run by JOB_WORKERS threads in each app process
+# (0 to leave them to `flask run-jobs`). Failed jobs are retried up to
+# JOB_MAX_ATTEMPTS times, waiting JOB_BACKOFF seconds doubled per attempt
+# (at most JOB_BACKOFF_MAX). Jobs running longer than JOB_TIMEOUT seconds
+# are assumed dead and run again; finished jobs are kept JOB_RETENTION
+# seconds. With JOB_QUEUE_ENABLED off, side effects run in the request.
+JOB_QUEUE_ENABLED = True
+JOB_WORKERS = 2
+JOB_POLL_INTERVAL = 1.0
+JOB_MAX_ATTEMPTS = 5
+JOB_BACKOFF = 2
+JOB_BACKOFF_MAX = 300
+JOB_TIMEOUT = 300
+JOB_RETENTION = 86400
+
+# Notification retention: read and unread notifications older than these many
+# days are deleted (None keeps them), NOTIFICATION_PURGE_BATCH rows per
+# transaction with NOTIFICATION_PURGE_PAUSE seconds between batches. With
+# NOTIFICATION_ARCHIVE they are summarized per user and kind first. The purge
+# runs from `flask purge-notifications` and, when NOTIFICATION_PURGE_INTERVAL
+# is non-zero, every that many seconds in each app process.
+NOTIFICATION_READ_TTL_DAYS = 30
+NOTIFICATION_UNREAD_TTL_DAYS = 180
+NOTIFICATION_PURGE_BATCH = 500
+NOTIFICATION_PURGE_PAUSE = 0.05
+NOTIFICATION_ARCHIVE = True
+NOTIFICATION_PURGE_INTERVAL = 0
+
+# Live updates over Server-Sent Events. The local backend only reaches clients
+# connected to the same process; swap in a shared backend for multiple workers.
+PUBSUB_BACKEND = 'app.pubsub.LocalBackend'
+STREAM_HEARTBEAT = 15
+STREAM_MAX_POSTS = 200
+
+# Maximum users returned by the search page and by search-as-you-type
+SEARCH_RESULTS_LIMIT = 50
+SEARCH_SUGGESTIONS_LIMIT = 8
+
+# Per-process cache of friend id sets: maximum users kept and seconds before
+# an entry is reloaded (bounds staleness across worker processes)
+FRIEND_CACHE_SIZE = 10000
+FRIEND_CACHE_TTL = 60
+
+# "People you may know": suggestions shown, friends expanded per query,
+# query time budget in milliseconds and seconds results are cached for
+SUGGESTIONS_LIMIT = 5
+SUGGESTION_FRIEND_SAMPLE = 500
+SUGGESTION_TIME_BUDGET_MS = 50
+SUGGESTION_CACHE_TTL = 300
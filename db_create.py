@@ -1,5 +1,5 @@
-from config import SQLALCHEMY_DATABASE_URI
-from app import db
-import os.path
+from app import create_app, db
 
-db.create_all()
\ No newline at end of file
+app = create_app()
+with app.app_context():
+    db.create_all()
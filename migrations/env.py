@@ -90,13 +90,31 @@ def run_migrations_online():
                 directives[:] = []
                 logger.info('No changes in schema detected.')
 
+    # the full-text search tables are created by hand in their migration
+    # (see app/search.py), so keep autogenerate from trying to drop them
+    def include_name(name, type_, parent_names):
+        if type_ == 'table':
+            return not name.startswith('user_search')
+        return True
+
     conf_args = current_app.extensions['migrate'].configure_args
     if conf_args.get("process_revision_directives") is None:
         conf_args["process_revision_directives"] = process_revision_directives
+    if conf_args.get("include_name") is None:
+        conf_args["include_name"] = include_name
 
     connectable = get_engine()
 
     with connectable.connect() as connection:
+        # Batch migrations rebuild SQLite tables; don't enforce foreign keys
+        # (enabled on every pooled connection) while they are copied. Commit
+        # so the migrations run in their own transaction, not the PRAGMA's.
+        sqlite = connection.dialect.name == 'sqlite'
+        if sqlite:
+            foreign_keys = connection.exec_driver_sql("PRAGMA foreign_keys").scalar()
+            connection.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            connection.commit()
+
         context.configure(
             connection=connection,
             target_metadata=get_metadata(),
@@ -106,6 +124,11 @@ def run_migrations_online():
         with context.begin_transaction():
             context.run_migrations()
 
+        # The connection goes back to the pool; restore its setting
+        if sqlite:
+            connection.exec_driver_sql(f"PRAGMA foreign_keys={foreign_keys}")
+            connection.commit()
+
 
 if context.is_offline_mode():
     run_migrations_offline()
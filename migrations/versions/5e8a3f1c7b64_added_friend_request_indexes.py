@@ -0,0 +1,30 @@
+"""Added friend request inbox indexes
+
+Revision ID: 5e8a3f1c7b64
+Revises: d47c2e8b9f31
+Create Date: 2026-10-17 18:41:27.113902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8a3f1c7b64'
+down_revision = 'd47c2e8b9f31'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('friend_request_table', schema=None) as batch_op:
+        batch_op.create_index('ix_friend_request_table_receiver_id_status', ['receiver_id', 'status'], unique=False)
+        batch_op.create_index('ix_friend_request_table_sender_id_receiver_id_status', ['sender_id', 'receiver_id', 'status'], unique=False)
+        batch_op.create_index('ix_friend_request_table_pending', ['receiver_id', 'timestamp'], unique=False, sqlite_where=sa.text("status = 'pending'"))
+
+
+def downgrade():
+    with op.batch_alter_table('friend_request_table', schema=None) as batch_op:
+        batch_op.drop_index('ix_friend_request_table_pending')
+        batch_op.drop_index('ix_friend_request_table_sender_id_receiver_id_status')
+        batch_op.drop_index('ix_friend_request_table_receiver_id_status')
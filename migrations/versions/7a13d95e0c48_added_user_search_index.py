@@ -0,0 +1,52 @@
+"""Added full-text user search index
+
+Revision ID: 7a13d95e0c48
+Revises: e2b84f1c6a37
+Create Date: 2026-10-17 13:41:27.905513
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a13d95e0c48'
+down_revision = 'e2b84f1c6a37'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # FTS5 external-content index over user_table, kept in sync by triggers
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS user_search USING fts5("
+        "username, full_name, bio, content='user_table', content_rowid='id', "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS user_search_insert AFTER INSERT ON user_table BEGIN "
+        "INSERT INTO user_search(rowid, username, full_name, bio) "
+        "VALUES (new.id, new.username, new.full_name, new.bio); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS user_search_delete AFTER DELETE ON user_table BEGIN "
+        "INSERT INTO user_search(user_search, rowid, username, full_name, bio) "
+        "VALUES ('delete', old.id, old.username, old.full_name, old.bio); END"
+    )
+    op.execute(
+        "CREATE TRIGGER IF NOT EXISTS user_search_update AFTER UPDATE OF username, full_name, bio ON user_table BEGIN "
+        "INSERT INTO user_search(user_search, rowid, username, full_name, bio) "
+        "VALUES ('delete', old.id, old.username, old.full_name, old.bio); "
+        "INSERT INTO user_search(rowid, username, full_name, bio) "
+        "VALUES (new.id, new.username, new.full_name, new.bio); END"
+    )
+
+    # Index the existing users
+    op.execute("INSERT INTO user_search(user_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    op.execute("DROP TRIGGER IF EXISTS user_search_update")
+    op.execute("DROP TRIGGER IF EXISTS user_search_delete")
+    op.execute("DROP TRIGGER IF EXISTS user_search_insert")
+    op.execute("DROP TABLE IF EXISTS user_search")
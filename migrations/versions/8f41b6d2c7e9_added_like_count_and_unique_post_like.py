@@ -0,0 +1,43 @@
+"""Added like_count to Post and unique post like constraint
+
+Revision ID: 8f41b6d2c7e9
+Revises: 3c9d1e7a5b20
+Create Date: 2026-10-17 10:02:15.734921
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f41b6d2c7e9'
+down_revision = '3c9d1e7a5b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('post_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('like_count', sa.Integer(), server_default='0', nullable=False))
+
+    # Drop duplicate likes before adding the unique constraint
+    op.execute(
+        "DELETE FROM post_likes WHERE id NOT IN "
+        "(SELECT MIN(id) FROM post_likes GROUP BY post_id, user_id)"
+    )
+    with op.batch_alter_table('post_likes', schema=None) as batch_op:
+        batch_op.create_unique_constraint('unique_post_like', ['post_id', 'user_id'])
+
+    # Backfill the counter from the existing likes
+    op.execute(
+        "UPDATE post_table SET like_count = "
+        "(SELECT COUNT(*) FROM post_likes WHERE post_likes.post_id = post_table.id)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('post_likes', schema=None) as batch_op:
+        batch_op.drop_constraint('unique_post_like', type_='unique')
+
+    with op.batch_alter_table('post_table', schema=None) as batch_op:
+        batch_op.drop_column('like_count')
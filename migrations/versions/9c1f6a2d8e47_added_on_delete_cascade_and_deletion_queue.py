@@ -0,0 +1,111 @@
+"""Added ON DELETE CASCADE foreign keys, deletion indexes and deletion_queue table
+
+Revision ID: 9c1f6a2d8e47
+Revises: 5e8a3f1c7b64
+Create Date: 2026-10-17 19:12:50.381146
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c1f6a2d8e47'
+down_revision = '5e8a3f1c7b64'
+branch_labels = None
+depends_on = None
+
+
+# SQLite can't alter a foreign key, so each table is rebuilt from a full
+# definition (indexes included) with or without ON DELETE CASCADE, and with
+# or without the indexes batched deletions look rows up by. Foreign keys
+# keep the names earlier revisions gave them.
+def tables(ondelete, deletion_indexes):
+    metadata = sa.MetaData()
+    sa.Table('user_table', metadata, sa.Column('id', sa.Integer(), primary_key=True))
+    user_fk = lambda: sa.ForeignKey('user_table.id', ondelete=ondelete)
+    post_fk = lambda name=None: sa.ForeignKey('post_table.id', ondelete=ondelete, name=name)
+    return [
+        sa.Table('friends', metadata,
+            sa.Column('user_id', sa.Integer(), user_fk()),
+            sa.Column('friend_id', sa.Integer(), user_fk()),
+            sa.UniqueConstraint('user_id', 'friend_id', name='unique_friendship'),
+            sa.Index('ix_friends_user_id', 'user_id'),
+            sa.Index('ix_friends_friend_id', 'friend_id')),
+        sa.Table('friend_request_table', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('sender_id', sa.Integer(), user_fk()),
+            sa.Column('receiver_id', sa.Integer(), user_fk()),
+            sa.Column('status', sa.String(length=20)),
+            sa.Column('timestamp', sa.DateTime()),
+            sa.Index('ix_friend_request_table_receiver_id_status', 'receiver_id', 'status'),
+            sa.Index('ix_friend_request_table_sender_id_receiver_id_status', 'sender_id', 'receiver_id', 'status'),
+            sa.Index('ix_friend_request_table_pending', 'receiver_id', 'timestamp',
+                     sqlite_where=sa.text("status = 'pending'"))),
+        sa.Table('post_table', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), user_fk()),
+            sa.Column('title', sa.String(length=30)),
+            sa.Column('desc', sa.String(length=500)),
+            sa.Column('timestamp', sa.DateTime()),
+            sa.Column('like_count', sa.Integer(), server_default='0', nullable=False),
+            sa.Index('ix_post_table_title', 'title', unique=True),
+            sa.Index('ix_post_table_user_id_timestamp', 'user_id', 'timestamp')),
+        sa.Table('post_likes', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('post_id', sa.Integer(), post_fk()),
+            sa.Column('user_id', sa.Integer(), user_fk()),
+            sa.Column('is_liked', sa.Boolean()),
+            sa.UniqueConstraint('post_id', 'user_id', name='unique_post_like'),
+            *([sa.Index('ix_post_likes_user_id', 'user_id')] if deletion_indexes else [])),
+        sa.Table('notification_table', metadata,
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('user_id', sa.Integer(), user_fk()),
+            sa.Column('timestamp', sa.DateTime()),
+            sa.Column('is_read', sa.Boolean()),
+            sa.Column('message', sa.String(length=200)),
+            sa.Column('kind', sa.String(length=20)),
+            sa.Column('post_id', sa.Integer(), post_fk('fk_notification_table_post_id')),
+            sa.Column('actor_count', sa.Integer(), server_default='1', nullable=False),
+            sa.Index('ix_notification_table_user_id_is_read_timestamp', 'user_id', 'is_read', 'timestamp'),
+            *([sa.Index('ix_notification_table_post_id', 'post_id')] if deletion_indexes else [])),
+        sa.Table('home_timeline', metadata,
+            sa.Column('user_id', sa.Integer(), user_fk(), primary_key=True),
+            sa.Column('post_id', sa.Integer(), post_fk(), primary_key=True),
+            sa.Column('timestamp', sa.DateTime(), nullable=False),
+            sa.Index('ix_home_timeline_user_id_timestamp_post_id', 'user_id', 'timestamp', 'post_id'),
+            sa.Index('ix_home_timeline_post_id', 'post_id')),
+        sa.Table('notification_archive', metadata,
+            sa.Column('user_id', sa.Integer(), user_fk(), primary_key=True),
+            sa.Column('kind', sa.String(length=20), primary_key=True),
+            sa.Column('notifications', sa.Integer(), nullable=False),
+            sa.Column('unread', sa.Integer(), nullable=False),
+            sa.Column('actors', sa.Integer(), nullable=False),
+            sa.Column('first_timestamp', sa.DateTime(), nullable=False),
+            sa.Column('last_timestamp', sa.DateTime(), nullable=False)),
+    ]
+
+
+def rebuild(ondelete, deletion_indexes):
+    for table in tables(ondelete, deletion_indexes):
+        with op.batch_alter_table(table.name, copy_from=table, recreate='always'):
+            pass
+
+
+def upgrade():
+    rebuild('CASCADE', True)
+
+    op.create_table('deletion_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('requested_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'target_id', name='unique_deletion')
+    )
+
+
+def downgrade():
+    op.drop_table('deletion_queue')
+
+    rebuild(None, False)
@@ -0,0 +1,40 @@
+"""Added home_timeline table
+
+Revision ID: b6f2d94e1a08
+Revises: 7a13d95e0c48
+Create Date: 2026-10-17 17:32:41.208113
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f2d94e1a08'
+down_revision = '7a13d95e0c48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('home_timeline',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('post_id', sa.Integer(), nullable=False),
+    sa.Column('timestamp', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['post_id'], ['post_table.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user_table.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    with op.batch_alter_table('home_timeline', schema=None) as batch_op:
+        batch_op.create_index('ix_home_timeline_user_id_timestamp_post_id', ['user_id', 'timestamp', 'post_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_home_timeline_post_id'), ['post_id'], unique=False)
+
+    # Rows are written once HOME_TIMELINE is enabled and `flask backfill-home-timeline` has run
+
+
+def downgrade():
+    with op.batch_alter_table('home_timeline', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_home_timeline_post_id'))
+        batch_op.drop_index('ix_home_timeline_user_id_timestamp_post_id')
+
+    op.drop_table('home_timeline')
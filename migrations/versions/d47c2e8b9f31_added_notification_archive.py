@@ -0,0 +1,34 @@
+"""Added notification_archive table
+
+Revision ID: d47c2e8b9f31
+Revises: b6f2d94e1a08
+Create Date: 2026-10-17 18:05:12.640318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd47c2e8b9f31'
+down_revision = 'b6f2d94e1a08'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_archive',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('notifications', sa.Integer(), nullable=False),
+    sa.Column('unread', sa.Integer(), nullable=False),
+    sa.Column('actors', sa.Integer(), nullable=False),
+    sa.Column('first_timestamp', sa.DateTime(), nullable=False),
+    sa.Column('last_timestamp', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['user_table.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'kind')
+    )
+
+
+def downgrade():
+    op.drop_table('notification_archive')
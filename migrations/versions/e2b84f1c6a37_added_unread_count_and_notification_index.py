@@ -0,0 +1,39 @@
+"""Added unread_count to User and notification user/read/timestamp index
+
+Revision ID: e2b84f1c6a37
+Revises: c5e0a7f93d14
+Create Date: 2026-10-17 12:05:09.442786
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b84f1c6a37'
+down_revision = 'c5e0a7f93d14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('user_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('notification_table', schema=None) as batch_op:
+        batch_op.create_index('ix_notification_table_user_id_is_read_timestamp', ['user_id', 'is_read', 'timestamp'], unique=False)
+
+    # Backfill the cached unread counts
+    op.execute(
+        "UPDATE user_table SET unread_count = "
+        "(SELECT COUNT(*) FROM notification_table "
+        "WHERE notification_table.user_id = user_table.id AND notification_table.is_read = 0)"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('notification_table', schema=None) as batch_op:
+        batch_op.drop_index('ix_notification_table_user_id_is_read_timestamp')
+
+    with op.batch_alter_table('user_table', schema=None) as batch_op:
+        batch_op.drop_column('unread_count')
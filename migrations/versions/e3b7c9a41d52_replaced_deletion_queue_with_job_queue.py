@@ -0,0 +1,62 @@
+"""Replaced deletion_queue with job_queue
+
+Revision ID: e3b7c9a41d52
+Revises: 9c1f6a2d8e47
+Create Date: 2026-10-17 20:03:18.554270
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3b7c9a41d52'
+down_revision = '9c1f6a2d8e47'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task', sa.String(length=50), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=True),
+    sa.Column('idempotency_key', sa.String(length=100), nullable=True),
+    sa.Column('status', sa.String(length=10), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_at', sa.Float(), nullable=False),
+    sa.Column('enqueued_at', sa.Float(), nullable=False),
+    sa.Column('started_at', sa.Float(), nullable=True),
+    sa.Column('finished_at', sa.Float(), nullable=True),
+    sa.Column('worker', sa.String(length=50), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('idempotency_key')
+    )
+    with op.batch_alter_table('job_queue', schema=None) as batch_op:
+        batch_op.create_index('ix_job_queue_status_run_at', ['status', 'run_at'], unique=False)
+
+    # Deletions still waiting in the old queue become jobs
+    op.execute("""
+        INSERT INTO job_queue (task, payload, idempotency_key, status, attempts, max_attempts, run_at, enqueued_at)
+        SELECT 'delete_' || kind, '{"' || kind || '_id": ' || target_id || '}', 'delete_' || kind || ':' || target_id,
+               'queued', 0, 5, CAST(strftime('%s', 'now') AS REAL), CAST(strftime('%s', 'now') AS REAL)
+        FROM deletion_queue
+    """)
+    op.drop_table('deletion_queue')
+
+
+def downgrade():
+    op.create_table('deletion_queue',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('target_id', sa.Integer(), nullable=False),
+    sa.Column('requested_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('kind', 'target_id', name='unique_deletion')
+    )
+    with op.batch_alter_table('job_queue', schema=None) as batch_op:
+        batch_op.drop_index('ix_job_queue_status_run_at')
+
+    op.drop_table('job_queue')
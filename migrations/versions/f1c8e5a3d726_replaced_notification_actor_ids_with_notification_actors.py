@@ -0,0 +1,61 @@
+"""Replaced notification actor_ids with the notification_actors table
+
+Revision ID: f1c8e5a3d726
+Revises: a6d4f2b8c193
+Create Date: 2026-10-17 23:41:07.215093
+
+"""
+import json
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f1c8e5a3d726'
+down_revision = 'a6d4f2b8c193'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification_actors',
+    sa.Column('notification_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['actor_id'], ['user_table.id'], ondelete='CASCADE'),
+    sa.ForeignKeyConstraint(['notification_id'], ['notification_table.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('notification_id', 'actor_id')
+    )
+    with op.batch_alter_table('notification_actors', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_notification_actors_actor_id'), ['actor_id'], unique=False)
+
+    # Carry over the likers counted so far
+    connection = op.get_bind()
+    rows = connection.execute(sa.text("SELECT id, actor_ids FROM notification_table WHERE actor_ids IS NOT NULL")).all()
+    pairs = [{'notification_id': notification_id, 'actor_id': actor_id}
+             for notification_id, actor_ids in rows for actor_id in json.loads(actor_ids) if actor_id is not None]
+    if pairs:
+        connection.execute(sa.text("""
+            INSERT OR IGNORE INTO notification_actors (notification_id, actor_id)
+            SELECT :notification_id, id FROM user_table WHERE id = :actor_id
+        """), pairs)
+
+    with op.batch_alter_table('notification_table', schema=None) as batch_op:
+        batch_op.drop_column('actor_ids')
+
+
+def downgrade():
+    with op.batch_alter_table('notification_table', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('actor_ids', sa.Text(), nullable=True))
+
+    op.execute("""
+        UPDATE notification_table SET actor_ids = (
+            SELECT '[' || GROUP_CONCAT(actor_id, ', ') || ']' FROM notification_actors
+            WHERE notification_id = notification_table.id
+        )
+        WHERE id IN (SELECT notification_id FROM notification_actors)
+    """)
+
+    with op.batch_alter_table('notification_actors', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_notification_actors_actor_id'))
+
+    op.drop_table('notification_actors')